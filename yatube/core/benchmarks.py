@@ -0,0 +1,130 @@
+"""Measurements shared by the benchmark commands.
+
+A sample is one request: its latency, the queries it ran and the time
+spent in SQL and in templates. Summaries of samples are saved as a JSON
+baseline that later runs are compared against.
+"""
+import json
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from statistics import median
+
+from django.template.base import Template
+
+from .queries import record_queries
+
+Sample = namedtuple(
+    'Sample', 'elapsed queries query_time render_time ok')
+# Latencies compared against the baseline, in milliseconds.
+LATENCY_METRICS = ('p50', 'p95')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[round(fraction * (len(ordered) - 1))]
+
+
+class RenderTimer:
+    def __init__(self):
+        self.duration = 0
+        self.depth = 0
+
+
+@contextmanager
+def record_render_time():
+    """Time spent rendering templates, includes counted once.
+
+    Patches ``Template._render``, so only use it from one thread.
+    """
+    timer = RenderTimer()
+    original = Template._render
+
+    def _render(template, context):
+        if timer.depth:
+            return original(template, context)
+        timer.depth += 1
+        started = time.perf_counter()
+        try:
+            return original(template, context)
+        finally:
+            timer.duration += time.perf_counter() - started
+            timer.depth -= 1
+
+    Template._render = _render
+    try:
+        yield timer
+    finally:
+        Template._render = original
+
+
+def measure(request):
+    """Run ``request()``, which returns a response, and sample it."""
+    with record_queries() as log, record_render_time() as render:
+        started = time.perf_counter()
+        response = request()
+        elapsed = time.perf_counter() - started
+    return Sample(elapsed, log.count, log.duration, render.duration,
+                  response.status_code < 400)
+
+
+def summarize(samples):
+    """Percentiles and medians of ``samples``; times in milliseconds."""
+    elapsed = [sample.elapsed * 1000 for sample in samples]
+    return {
+        'requests': len(samples),
+        'p50': round(percentile(elapsed, 0.5), 3),
+        'p95': round(percentile(elapsed, 0.95), 3),
+        'queries': percentile([sample.queries for sample in samples], 0.5),
+        'query_time': round(median(
+            sample.query_time * 1000 for sample in samples), 3),
+        'render_time': round(median(
+            sample.render_time * 1000 for sample in samples), 3),
+        'errors': sum(not sample.ok for sample in samples),
+    }
+
+
+def find_regressions(results, baseline, threshold, slack=1.0):
+    """Differences from ``baseline`` that count as regressions.
+
+    Both map a scale to view summaries. Latency may grow by ``threshold``
+    (a fraction) plus ``slack`` milliseconds of noise; the query count
+    may not grow at all and a view may not start failing.
+    """
+    found = []
+    for scale, views in results.items():
+        for view, current in views.items():
+            name = f'{scale} {view}'
+            if current['errors']:
+                found.append(f'{name}: ошибок {current["errors"]}')
+            previous = baseline.get(scale, {}).get(view)
+            if previous is None:
+                continue
+            for metric in LATENCY_METRICS:
+                limit = previous[metric] * (1 + threshold) + slack
+                if current[metric] > limit:
+                    found.append(
+                        f'{name}: {metric} {current[metric]:.1f} мс, '
+                        f'было {previous[metric]:.1f} мс')
+            if current['queries'] > previous['queries']:
+                found.append(
+                    f'{name}: запросов {current["queries"]}, '
+                    f'было {previous["queries"]}')
+    return found
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def save_baseline(path, results):
+    """Merge ``results`` into the baseline at ``path`` by scale."""
+    baseline = {**(load_baseline(path) or {}), **results}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(baseline, stream, ensure_ascii=False, indent=2,
+                  sort_keys=True)
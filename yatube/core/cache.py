@@ -0,0 +1,250 @@
+"""Versioned cache namespaces and page caching on top of them.
+
+Expensive entries are rebuilt by a single worker at a time: the others
+keep serving the previous value (stale-while-revalidate) or wait briefly
+for the winner instead of all recomputing at once.
+"""
+import atexit
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.cache import CacheMiddleware
+from django.utils.cache import (get_cache_key, learn_cache_key,
+                                patch_vary_headers)
+
+from .replicas import use_primary
+
+VERSION_KEY = 'cache_version:{}'
+STATS_KEY = 'cache_stats:{}:{}'
+LOCK_KEY = 'cache_lock:{}'
+STATS_KINDS = ('hits', 'misses', 'stale')
+
+
+_stats_lock = threading.Lock()
+_pending_stats = Counter()
+_stats_flushed_at = time.monotonic()
+
+
+def _incr(key, initial, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, initial, None)
+        return initial
+
+
+def get_version(namespace):
+    """Current version of a namespace.
+
+    A missing counter restarts from the clock, so an evicted version can
+    never make old entries reachable again.
+    """
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Make every entry cached under the namespace unreachable."""
+    return _incr(VERSION_KEY.format(namespace), int(time.time() * 1000))
+
+
+def make_etag(request, namespaces):
+    """ETag for the request built from namespace versions only.
+
+    It changes whenever one of the namespaces is bumped, costs one cache
+    round-trip per namespace and never touches the database.
+    """
+    parts = [request.get_full_path(), str(request.user.pk)]
+    parts.extend(str(get_version(namespace)) for namespace in namespaces)
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def record_lookup(namespace, kind):
+    """Count a lookup in this process; counts reach the cache in batches.
+
+    Writing every hit through to the shared store would turn each read
+    into a write, so counts are flushed every
+    ``CACHE_STATS_FLUSH_INTERVAL`` seconds.
+    """
+    global _stats_flushed_at
+    with _stats_lock:
+        _pending_stats[namespace, kind] += 1
+        if (time.monotonic() - _stats_flushed_at
+                < settings.CACHE_STATS_FLUSH_INTERVAL):
+            return
+        _stats_flushed_at = time.monotonic()
+    flush_stats()
+
+
+def flush_stats():
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+        _stats_flushed_at = time.monotonic()
+    for (namespace, kind), count in pending.items():
+        _incr(STATS_KEY.format(namespace, kind), count, count)
+
+
+atexit.register(flush_stats)
+
+
+def get_stats(namespace):
+    """Counts of all processes, including this one's unflushed ones."""
+    flush_stats()
+    return {
+        kind: cache.get(STATS_KEY.format(namespace, kind), 0)
+        for kind in STATS_KINDS
+    }
+
+
+def acquire_lock(name):
+    """Try to become the single worker rebuilding ``name``."""
+    return cache.add(LOCK_KEY.format(name), 1, settings.CACHE_LOCK_TIMEOUT)
+
+
+def release_lock(name):
+    cache.delete(LOCK_KEY.format(name))
+
+
+def wait_for(lookup, name):
+    """Poll ``lookup`` while the lock ``name`` is held.
+
+    Returns ``None`` once the lock is released or expires without
+    ``lookup`` returning a value, e.g. when the winner failed or built
+    something else; the caller then builds the value itself.
+    """
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+        # Checked before the lookup: a value stored before the release
+        # is visible to it.
+        held = cache.get(LOCK_KEY.format(name)) is not None
+        value = lookup()
+        if value is not None or not held:
+            return value
+    return None
+
+
+def single_flight(key, build, timeout):
+    """``cache.get_or_set`` where only one caller runs ``build`` at a time.
+
+    Entries outlive ``timeout`` by ``CACHE_STALE_TIMEOUT``; while one
+    caller rebuilds an expired entry the others get the stale value.
+    ``build`` reads from the primary database.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry[1] > time.time():
+        return entry[0]
+    locked = acquire_lock(key)
+    if not locked:
+        if entry is None:
+            entry = wait_for(lambda: cache.get(key), key)
+        if entry is not None:
+            return entry[0]
+    try:
+        with use_primary():
+            value = build()
+        cache.set(
+            key,
+            (value, time.time() + timeout),
+            timeout + settings.CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        if locked:
+            release_lock(key)
+    return value
+
+
+def _store_stale(request, response, prefix):
+    if response.status_code == 200 and not response.streaming:
+        key = learn_cache_key(
+            request, response, settings.CACHE_STALE_TIMEOUT, prefix,
+            cache=cache)
+        cache.set(key, response, settings.CACHE_STALE_TIMEOUT)
+    return response
+
+
+def _get_stale(request, middleware, prefix, lock):
+    """Last rendered copy, or the winner's fresh one once it is ready."""
+    key = get_cache_key(request, prefix, 'GET', cache=cache)
+    response = cache.get(key) if key is not None else None
+    return response or wait_for(
+        lambda: middleware.process_request(request), lock)
+
+
+def _lock_name(request, namespace, prefix):
+    """One lock per cached variant of the page.
+
+    The page cache varies on headers such as Cookie; requests of other
+    variants could not use the winner's copy, so they get locks of their
+    own. The headers are learned under the version-independent stale
+    prefix; before the first response they are not known yet.
+    """
+    key = get_cache_key(request, prefix, 'GET', cache=cache)
+    return f'{namespace}:{key or request.get_full_path()}'
+
+
+def _render_page(view_func, request, args, kwargs, middleware, prefix):
+    # Stored under the current version for hours, so it must not be
+    # rendered from a replica that has not seen the latest writes yet.
+    with use_primary():
+        response = view_func(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    # Pages show who is logged in. The session middleware adds this only
+    # after the page would have been cached for every visitor.
+    patch_vary_headers(response, ('Cookie',))
+    response = middleware.process_response(request, response)
+    return _store_stale(request, response, prefix)
+
+
+def cache_page_versioned(timeout, namespace):
+    """Like ``cache_page`` but keyed by the namespace version.
+
+    Pages may be cached for hours: a ``bump_version`` after a write makes
+    the next request render fresh content. Only one request per cached
+    variant renders a missing page; concurrent ones get the last rendered
+    copy.
+    """
+    stale_prefix = f'{namespace}.stale'
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            middleware = CacheMiddleware(
+                cache_timeout=timeout,
+                key_prefix=f'{namespace}.v{get_version(namespace)}',
+            )
+            response = middleware.process_request(request)
+            if response is not None:
+                record_lookup(namespace, 'hits')
+                return response
+            lock = _lock_name(request, namespace, stale_prefix)
+            locked = acquire_lock(lock)
+            if not locked:
+                response = _get_stale(
+                    request, middleware, stale_prefix, lock)
+                if response is not None:
+                    record_lookup(namespace, 'stale')
+                    return response
+            record_lookup(namespace, 'misses')
+            try:
+                return _render_page(view_func, request, args, kwargs,
+                                    middleware, stale_prefix)
+            finally:
+                if locked:
+                    release_lock(lock)
+        return wrapped_view
+    return decorator
@@ -0,0 +1,298 @@
+"""Two-tier cache: a bounded in-process LRU in front of a shared SQLite file.
+
+Every worker process on the machine shares the L2 store, so an entry
+rendered by one worker is a hit for all of them. Each L1 entry remembers
+the generation of its key slot; any write bumps that generation in a
+memory-mapped file, which invalidates the entry in every other worker
+without a round-trip to L2.
+"""
+import mmap
+import os
+import pickle
+import random
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+GENERATION = struct.Struct('<Q')
+CULL_PROBABILITY = 0.01
+SQL_BATCH_SIZE = 500
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._location = location
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._slots = int(options.get('GENERATION_SLOTS', 4096))
+        self._l1 = OrderedDict()
+        self._l1_lock = threading.RLock()
+        self._local = threading.local()
+        self._pid = None
+        self._generations = None
+        self._generations_fd = None
+
+    # Shared state, reopened after fork.
+
+    def _ensure_process(self):
+        if self._pid == os.getpid():
+            return
+        with self._l1_lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self._location, exist_ok=True)
+            path = os.path.join(self._location, 'generations.bin')
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = (self._slots + 1) * GENERATION.size
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._generations_fd = fd
+            self._generations = mmap.mmap(fd, size)
+            self._l1.clear()
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+    def _connection(self):
+        self._ensure_process()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self._location, 'cache.sqlite3'),
+                timeout=30,
+                isolation_level=None,
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def _slot(self, key):
+        return zlib.crc32(key.encode()) % self._slots + 1
+
+    def _generation(self, slot):
+        return GENERATION.unpack_from(
+            self._generations, slot * GENERATION.size)[0]
+
+    def _bump(self, slot):
+        if fcntl is not None:
+            fcntl.flock(self._generations_fd, fcntl.LOCK_EX)
+        try:
+            offset = slot * GENERATION.size
+            value = GENERATION.unpack_from(self._generations, offset)[0]
+            GENERATION.pack_into(self._generations, offset, value + 1)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._generations_fd, fcntl.LOCK_UN)
+
+    def _stamp(self, key):
+        return self._generation(self._slot(key)), self._generation(0)
+
+    # L1 helpers.
+
+    def _l1_get(self, key, stamp):
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            value, expires, entry_stamp = entry
+            if entry_stamp != stamp or self._expired(expires):
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return value
+
+    def _l1_set(self, key, value, expires, stamp):
+        with self._l1_lock:
+            self._l1[key] = (value, expires, stamp)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_forget(self, key):
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    # L2 helpers.
+
+    @staticmethod
+    def _expired(expires):
+        return expires is not None and expires <= time.time()
+
+    def _expiry(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _cull(self, conn):
+        conn.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()
+        if count[0] > self._max_entries:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count[0] // self._cull_frequency,),
+            )
+
+    def _written(self, key):
+        self._l1_forget(key)
+        self._bump(self._slot(key))
+
+    # Cache API.
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        conn = self._connection()
+        made = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = key
+        found = {}
+        stamps = {}
+        for made_key in made:
+            stamps[made_key] = self._stamp(made_key)
+            value = self._l1_get(made_key, stamps[made_key])
+            if value is not None:
+                found[made_key] = value
+        missing = [key for key in made if key not in found]
+        for start in range(0, len(missing), SQL_BATCH_SIZE):
+            batch = missing[start:start + SQL_BATCH_SIZE]
+            rows = conn.execute(
+                'SELECT key, value, expires FROM cache_entries '
+                f'WHERE key IN ({",".join("?" * len(batch))})',
+                batch,
+            ).fetchall()
+            for made_key, value, expires in rows:
+                if self._expired(expires):
+                    continue
+                self._l1_set(made_key, value, expires, stamps[made_key])
+                found[made_key] = value
+        return {made[key]: pickle.loads(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        conn = self._connection()
+        expires = self._expiry(timeout)
+        rows = []
+        for key, value in data.items():
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            rows.append((
+                made_key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires,
+            ))
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                rows,
+            )
+            if random.random() < CULL_PROBABILITY:
+                self._cull(conn)
+        for made_key, _, _ in rows:
+            self._written(made_key)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        conn = self._connection()
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            added = conn.execute(
+                'INSERT OR IGNORE INTO cache_entries (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expiry(timeout)),
+            ).rowcount == 1
+        if added:
+            self._written(key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        conn = self._connection()
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with conn:
+            touched = conn.execute(
+                'UPDATE cache_entries SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expiry(timeout), key, time.time()),
+            ).rowcount == 1
+        if touched:
+            self._written(key)
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        conn = self._connection()
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?',
+                (key,),
+            ).fetchone()
+            if row is None or self._expired(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            conn.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        self._written(key)
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        conn = self._connection()
+        made_keys = []
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made_keys.append(made_key)
+        with conn:
+            conn.executemany(
+                'DELETE FROM cache_entries WHERE key = ?',
+                ((key,) for key in made_keys),
+            )
+        for made_key in made_keys:
+            self._written(made_key)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM cache_entries')
+        with self._l1_lock:
+            self._l1.clear()
+        self._bump(0)
@@ -0,0 +1,27 @@
+"""Connection setup for the SQLite database.
+
+Every new connection gets the pragmas from ``settings.SQLITE_PRAGMAS``:
+WAL lets readers keep going while a writer commits, and the cache, mmap
+and busy timeout settings are per connection, so they have to be applied
+each time one is opened. ``CONN_MAX_AGE`` keeps the connection, and the
+pages it has cached, alive between requests of the same worker.
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def get_pragmas(connection, names=None):
+    """Current values of the tuned pragmas on ``connection``."""
+    values = {}
+    with connection.cursor() as cursor:
+        for pragma in names or settings.SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {pragma}')
+            values[pragma] = cursor.fetchone()[0]
+    return values
@@ -0,0 +1,209 @@
+"""Pre-forked WSGI workers and HTTP clients for local load tests.
+
+The listening socket is opened once and inherited by forked workers, as
+in pre-fork servers, so the kernel spreads connections among them. The
+clients are separate processes as well and talk to the workers over
+HTTP only, which keeps the measurements free of shared interpreter
+state.
+"""
+import http.cookiejar
+import multiprocessing
+import signal
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .benchmarks import percentile
+
+HOST = '127.0.0.1'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PreforkServer(WSGIServer):
+    # Connections wait in the backlog while every worker is busy.
+    request_queue_size = 1024
+
+
+def _serve(server, application):
+    # Returning normally lets the worker finalize the pools it started;
+    # shutdown() waits for the loop, so it cannot run in this thread.
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+        target=server.shutdown).start())
+    server.set_app(import_string(application))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(application, count, port=0):
+    """Fork ``count`` processes serving the dotted ``application``.
+
+    Returns the base URL and the processes.
+    """
+    server = PreforkServer((HOST, port), QuietHandler)
+    # Forked workers must open their own database connections.
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    workers = [
+        context.Process(target=_serve, args=(server, application))
+        for _ in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    server.socket.close()
+    return f'http://{HOST}:{server.server_port}', workers
+
+
+def stop_workers(workers):
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def encode_multipart(fields, files):
+    """Body and content type of a ``multipart/form-data`` request.
+
+    ``files`` maps field names to ``(filename, content, content_type)``.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; '
+            f'name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; '
+            f'name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+            + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class HTTPSession:
+    """Browser-like client: keeps cookies and does not follow redirects.
+
+    POST requests carry the CSRF token from the ``csrftoken`` cookie, so
+    the session has to visit a page with a form first.
+    """
+
+    def __init__(self, base_url, cookies=None, timeout=30):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.jar), _NoRedirect)
+        for name, value in (cookies or {}).items():
+            self.jar.set_cookie(http.cookiejar.Cookie(
+                version=0, name=name, value=value, port=None,
+                port_specified=False, domain=HOST, domain_specified=False,
+                domain_initial_dot=False, path='/', path_specified=True,
+                secure=False, expires=None, discard=True, comment=None,
+                comment_url=None, rest={}))
+
+    def cookie(self, name):
+        for cookie in self.jar:
+            if cookie.name == name:
+                return cookie.value
+        return None
+
+    def get(self, path):
+        return self.open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, fields, files=None):
+        fields = {'csrfmiddlewaretoken': self.cookie('csrftoken') or '',
+                  **fields}
+        if files:
+            data, content_type = encode_multipart(fields, files)
+        else:
+            data = urllib.parse.urlencode(fields).encode()
+            content_type = 'application/x-www-form-urlencoded'
+        return self.open(urllib.request.Request(
+            self.base_url + path, data, {'Content-Type': content_type}))
+
+    def open(self, request):
+        """Status code and body; network errors are raised."""
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            with error:
+                return error.code, error.read()
+
+
+def run_clients(target, arguments):
+    """Call ``target`` with each argument tuple in its own process."""
+    context = multiprocessing.get_context('fork')
+    with context.Pool(len(arguments)) as pool:
+        return pool.starmap(target, arguments)
+
+
+def summarize_samples(samples, duration):
+    """Throughput, latency percentiles and error share of samples.
+
+    A sample is ``(offset, name, latency, error)`` with the latency in
+    seconds and ``error`` ``None`` for a successful request.
+    """
+    latencies = [sample[2] * 1000 for sample in samples]
+    errors = sum(sample[3] is not None for sample in samples)
+    return {
+        'requests': len(samples),
+        'throughput': len(samples) / duration if duration else 0,
+        'p50': percentile(latencies, 0.5) if latencies else 0,
+        'p95': percentile(latencies, 0.95) if latencies else 0,
+        'p99': percentile(latencies, 0.99) if latencies else 0,
+        'error_rate': errors / len(samples) if samples else 0,
+    }
+
+
+def time_series(samples, interval, duration):
+    """``(start, summary)`` for each ``interval`` seconds of the run."""
+    buckets = defaultdict(list)
+    for sample in samples:
+        buckets[int(sample[0] // interval)].append(sample)
+    for number in range(int(-(-duration // interval))):
+        start = number * interval
+        length = min(interval, duration - start)
+        yield start, summarize_samples(buckets[number], length)
+
+
+def by_name(samples, duration):
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample[1]].append(sample)
+    return {name: summarize_samples(group, duration)
+            for name, group in sorted(groups.items())}
+
+
+def error_counts(samples):
+    counts = defaultdict(int)
+    for _, name, _, error in samples:
+        if error is not None:
+            counts[f'{name}: {error}'] += 1
+    return dict(counts)
+
+
+def sleep_until(moment):
+    delay = moment - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from core.benchmarks import percentile
+from core.db import get_pragmas
+from posts.models import Group, Post, User
+
+BENCHMARK_USERNAME = 'sqlite-benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Measure feed read throughput while comments and posts are '
+            'written concurrently. Writes go to the configured database '
+            f'as user "{BENCHMARK_USERNAME}", who is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to run.')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        try:
+            self.run(user, options)
+        finally:
+            user.delete()
+
+    def run(self, user, options):
+        post = Post.objects.order_by('-pub_date').first() or (
+            Post.objects.create(author=user, text='Пост для замеров'))
+        read_urls = [
+            ('index', reverse('posts:index')),
+            ('profile', reverse('posts:profile', args=[post.author])),
+            ('post_detail', reverse('posts:post_detail', args=[post.pk])),
+            ('follow_index', reverse('posts:follow_index')),
+        ]
+        group = Group.objects.first()
+        if group is not None:
+            read_urls.append((
+                'group_posts',
+                reverse('posts:group_list', args=[group.slug])))
+        write_requests = [
+            ('add_comment', reverse('posts:add_comment', args=[post.pk]),
+             {'text': 'Комментарий для замеров'}),
+            ('post_create', reverse('posts:post_create'),
+             {'text': 'Пост для замеров'}),
+        ]
+        self.stdout.write(f'SQLite: {get_pragmas(connection)}')
+
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(requests, write):
+            client = Client()
+            client.force_login(user)
+            step = 0
+            try:
+                while time.monotonic() < deadline:
+                    name, url, *data = requests[step % len(requests)]
+                    step += 1
+                    started = time.perf_counter()
+                    if write:
+                        response = client.post(url, data[0])
+                        ok = response.status_code == 302
+                    else:
+                        ok = client.get(url).status_code == 200
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        samples[name].append(elapsed)
+                        if not ok:
+                            errors[name] += 1
+            except Exception as error:
+                with lock:
+                    errors[type(error).__name__] += 1
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(read_urls, False))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(write_requests, True))
+            for _ in range(options['writers'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report(samples, errors, time.monotonic() - started,
+                    [name for name, *_ in read_urls])
+
+    def report(self, samples, errors, elapsed, read_names):
+        reads = 0
+        for name, values in sorted(samples.items()):
+            if name in read_names:
+                reads += len(values)
+            self.stdout.write(
+                f'{name}: {len(values) / elapsed:.1f} запр./с, '
+                f'p50 {percentile(values, 0.5) * 1000:.1f} мс, '
+                f'p95 {percentile(values, 0.95) * 1000:.1f} мс, '
+                f'ошибок {errors.pop(name, 0)}')
+        for name, count in errors.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(f'Чтение: {reads / elapsed:.1f} запр./с.')
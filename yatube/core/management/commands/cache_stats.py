@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import get_stats, get_version
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of versioned page caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespaces', nargs='*', default=['index_page'])
+
+    def handle(self, *args, **options):
+        for namespace in options['namespaces']:
+            stats = get_stats(namespace)
+            lookups = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / lookups if lookups else 0
+            self.stdout.write(
+                f'{namespace}: версия {get_version(namespace)}, '
+                f'попаданий {stats["hits"]}, промахов {stats["misses"]}, '
+                f'устаревших ответов {stats["stale"]}, '
+                f'доля попаданий {ratio:.1%}'
+            )
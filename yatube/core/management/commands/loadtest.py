@@ -0,0 +1,230 @@
+import io
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from PIL import Image
+
+from core.loadtest import (HTTPSession, by_name, error_counts, run_clients,
+                           sleep_until, start_workers, stop_workers,
+                           summarize_samples, time_series)
+from core.tasks import wait_for_tasks
+from posts.models import Group, Post, User
+
+LOAD_USERNAME = 'loadtest-{}'
+# Relative weights of the scenarios in the traffic mix.
+MIX = {
+    'index': 30,
+    'group': 15,
+    'post_detail': 20,
+    'follow_feed': 15,
+    'comment': 8,
+    'post_with_image': 4,
+    'follow': 8,
+}
+TARGETS = 1000
+STARTUP_DELAY = 1
+
+
+class Visitor:
+    """Simulated person who browses anonymously and as a user.
+
+    Each scenario makes one request and returns whether it succeeded.
+    """
+
+    def __init__(self, base_url, session_key, targets, seed):
+        self.rng = random.Random(seed)
+        self.targets = targets
+        self.anonymous = HTTPSession(base_url)
+        self.user = HTTPSession(
+            base_url, {settings.SESSION_COOKIE_NAME: session_key})
+        self.followed = set()
+        # Sets the CSRF cookie the forms are posted with.
+        self.user.get(reverse('posts:post_create'))
+
+    def index(self):
+        return self.anonymous.get(reverse('posts:index'))[0] == 200
+
+    def group(self):
+        slug = self.rng.choice(self.targets['groups'])
+        return self.anonymous.get(
+            reverse('posts:group_list', args=[slug]))[0] == 200
+
+    def post_detail(self):
+        post_id = self.rng.choice(self.targets['posts'])
+        return self.anonymous.get(
+            reverse('posts:post_detail', args=[post_id]))[0] == 200
+
+    def follow_feed(self):
+        return self.user.get(reverse('posts:follow_index'))[0] == 200
+
+    def comment(self):
+        post_id = self.rng.choice(self.targets['posts'])
+        status, _ = self.user.post(
+            reverse('posts:add_comment', args=[post_id]),
+            {'text': 'Комментарий под нагрузкой'})
+        return status == 302
+
+    def post_with_image(self):
+        image = Image.linear_gradient('L').resize((480, 320)).convert('RGB')
+        # A pixel of its own keeps the upload from being deduplicated.
+        image.putpixel(
+            (self.rng.randrange(480), self.rng.randrange(320)),
+            tuple(self.rng.randrange(256) for _ in range(3)))
+        content = io.BytesIO()
+        image.save(content, 'JPEG')
+        status, _ = self.user.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост под нагрузкой'},
+            {'image': ('load.jpg', content.getvalue(), 'image/jpeg')})
+        return status == 302
+
+    def follow(self):
+        """Follow an author, or unfollow one followed earlier."""
+        if self.followed and self.rng.random() < 0.5:
+            author = self.followed.pop()
+            view = 'posts:profile_unfollow'
+        else:
+            author = self.rng.choice(self.targets['authors'])
+            self.followed.add(author)
+            view = 'posts:profile_follow'
+        return self.user.get(reverse(view, args=[author]))[0] == 302
+
+
+def visit(base_url, session_key, targets, mix, seed, start, duration, think):
+    """Replay ``mix`` from ``start`` for ``duration`` seconds; samples."""
+    visitor = Visitor(base_url, session_key, targets, seed)
+    names, weights = zip(*mix.items())
+    samples = []
+    sleep_until(start)
+    while time.monotonic() < start + duration:
+        name = visitor.rng.choices(names, weights)[0]
+        started = time.monotonic()
+        try:
+            error = None if getattr(visitor, name)() else 'status'
+        except OSError as exception:
+            error = type(exception).__name__
+        finished = time.monotonic()
+        samples.append((started - start, name, finished - started, error))
+        if think:
+            time.sleep(visitor.rng.expovariate(1 / think))
+    return samples
+
+
+class Command(BaseCommand):
+    help = ('Serve yatube.wsgi from several forked worker processes and '
+            'drive it with client processes replaying a weighted mix of '
+            'browsing, feeds, comments, image posts and follows. Needs '
+            'existing posts; see generate_dataset. Activity is done as '
+            'temporary users "loadtest-N", deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Server processes.')
+        parser.add_argument(
+            '--clients', type=int, default=16,
+            help='Client processes, each one simulated person.')
+        parser.add_argument(
+            '--duration', type=float, default=30, help='Seconds to run.')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds per line of the time series.')
+        parser.add_argument(
+            '--think', type=float, default=0,
+            help='Mean pause between requests of a client, in seconds.')
+        parser.add_argument(
+            '--application', default='yatube.wsgi.application',
+            help='Dotted path of the WSGI application.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        last_post = Post.objects.aggregate(last=Max('pk'))['last']
+        if last_post is None:
+            raise CommandError(
+                'Постов нет: сначала создайте данные командой '
+                'generate_dataset.')
+        rng = random.Random(options['seed'])
+        targets = self.targets(rng)
+        mix = dict(MIX)
+        if not targets['groups']:
+            del mix['group']
+        users = [
+            User.objects.get_or_create(
+                username=LOAD_USERNAME.format(number))[0]
+            for number in range(options['clients'])
+        ]
+        try:
+            self.run(users, targets, mix, options)
+        finally:
+            for user in users:
+                user.delete()
+            wait_for_tasks()
+
+    def targets(self, rng):
+        """Posts, groups and authors the clients pick from."""
+        def sample(queryset, field):
+            last = queryset.aggregate(last=Max('pk'))['last'] or 0
+            picks = rng.sample(range(1, last + 1), min(TARGETS, last))
+            return list(queryset.filter(pk__in=picks).values_list(
+                field, flat=True))
+
+        return {
+            'posts': sample(Post.objects, 'pk'),
+            'groups': sample(Group.objects, 'slug'),
+            'authors': sample(User.objects.exclude(
+                username__startswith=LOAD_USERNAME.format('')), 'username'),
+        }
+
+    def run(self, users, targets, mix, options):
+        session_keys = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            session_keys.append(
+                client.cookies[settings.SESSION_COOKIE_NAME].value)
+        base_url, workers = start_workers(
+            options['application'], options['workers'])
+        self.stdout.write(
+            f'{base_url}: процессов {len(workers)}, клиентов '
+            f'{len(users)}, {options["duration"]:g} с.')
+        duration = options['duration']
+        start = time.monotonic() + STARTUP_DELAY
+        try:
+            results = run_clients(visit, [
+                (base_url, key, targets, mix, options['seed'] + number,
+                 start, duration, options['think'])
+                for number, key in enumerate(session_keys)
+            ])
+            crashed = sum(not worker.is_alive() for worker in workers)
+        finally:
+            stop_workers(workers)
+        samples = sorted(sample for result in results for sample in result)
+        self.report(samples, duration, options['interval'])
+        if crashed:
+            self.stdout.write(f'Упавших процессов сервера: {crashed}')
+
+    def report(self, samples, duration, interval):
+        for start, summary in time_series(samples, interval, duration):
+            self.stdout.write(
+                f'{start:6.0f} с: {self.format(summary)}')
+        self.stdout.write('Сценарии:')
+        for name, summary in by_name(samples, duration).items():
+            self.stdout.write(f'  {name}: {self.format(summary)}')
+        for error, count in sorted(error_counts(samples).items()):
+            self.stdout.write(f'  ошибка {error}: {count}')
+        self.stdout.write(
+            f'Всего: {self.format(summarize_samples(samples, duration))}')
+
+    @staticmethod
+    def format(summary):
+        return (f'{summary["throughput"]:.1f} запр./с, '
+                f'p50 {summary["p50"]:.1f} мс, '
+                f'p95 {summary["p95"]:.1f} мс, '
+                f'p99 {summary["p99"]:.1f} мс, '
+                f'ошибок {summary["error_rate"]:.1%}')
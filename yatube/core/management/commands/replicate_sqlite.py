@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import PRIMARY, mark_synced
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into every replica with the '
+            'online backup API; a local stand-in for real replication.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Seconds between syncs.')
+        parser.add_argument(
+            '--once', action='store_true', help='Sync once and exit.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_SQLITE_REPLICAS.')
+        while True:
+            self.sync()
+            if options['once']:
+                self.stdout.write(
+                    'Реплики обновлены: '
+                    f'{", ".join(settings.DATABASE_REPLICAS)}.')
+                return
+            time.sleep(options['interval'])
+
+    def sync(self):
+        source = sqlite3.connect(settings.DATABASES[PRIMARY]['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(
+                    settings.DATABASES[alias]['NAME'], timeout=30)
+                try:
+                    # A consistent snapshot, even while the primary is
+                    # being written to.
+                    source.backup(target)
+                finally:
+                    target.close()
+                mark_synced(alias)
+        finally:
+            source.close()
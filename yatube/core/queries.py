@@ -0,0 +1,115 @@
+"""Per-request SQL recording, N+1 detection and query budgets.
+
+Views declare how many queries they may run with ``query_budget``.
+``QueryInspectorMiddleware`` records every statement of a request and
+reports it when the budget is exceeded or when one SELECT shape repeats
+with different parameters, the signature of a lazy relation read in a
+loop. ``QUERY_INSPECTOR_MODE`` is ``'raise'`` under tests, ``'log'`` in
+development or staging and ``'off'`` in production.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(count):
+    """Declare how many queries the view may run per request."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(*args, **kwargs):
+            return view_func(*args, **kwargs)
+        wrapped_view.query_budget = count
+        return wrapped_view
+    return decorator
+
+
+def query_shape(sql):
+    """``sql`` with ``IN`` lists of any length collapsed to one form."""
+    return PLACEHOLDERS.sub('(...)', sql)
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, limit=None):
+        """SELECT shapes run more than ``limit`` times, with their counts."""
+        if limit is None:
+            limit = settings.QUERY_REPEAT_LIMIT
+        shapes = Counter(
+            query_shape(sql) for sql, _ in self.queries
+            if sql.lstrip().upper().startswith('SELECT'))
+        return {shape: seen for shape, seen in shapes.items() if seen > limit}
+
+    def problems(self, budget=None):
+        found = [
+            f'{seen} раз: {shape}'
+            for shape, seen in self.repeated().items()
+        ]
+        if budget is not None and self.count > budget:
+            found.insert(0, f'запросов {self.count}, бюджет {budget}')
+        return found
+
+
+@contextmanager
+def record_queries():
+    """Record the statements run on every connection of this thread."""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+class QueryInspectorMiddleware:
+    def __init__(self, get_response):
+        if settings.QUERY_INSPECTOR_MODE == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with record_queries() as log:
+            response = self.get_response(request)
+        response['X-Query-Count'] = log.count
+        problems = log.problems(request.query_budget)
+        if problems:
+            message = f'{request.method} {request.path}: ' + '; '.join(
+                problems)
+            if settings.QUERY_INSPECTOR_MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
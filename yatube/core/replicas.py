@@ -0,0 +1,137 @@
+"""Routing of reads to database replicas.
+
+Reads of requests go to one of ``settings.DATABASE_REPLICAS`` whose last
+sync is at most ``REPLICA_MAX_LAG`` seconds old, and to the primary when
+none is; reads outside requests, such as management commands, always go
+to the primary.
+A request that writes pins its user to the primary for
+``REPLICA_PIN_SECONDS`` through a cookie, so they always see their own
+posts, comments and follows. Sessions are always read from the primary.
+With no replicas configured every query goes to ``default``.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY = 'default'
+PIN_COOKIE = 'primary_db'
+SYNCED_KEY = 'replica_synced:{}'
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+_health = {'checked': 0, 'replicas': (), 'aliases': ()}
+
+
+def mark_synced(alias):
+    """Record that ``alias`` has just caught up with the primary."""
+    cache.set(SYNCED_KEY.format(alias), time.time(), None)
+
+
+def replica_lag(alias):
+    """Seconds since ``alias`` last caught up, ``None`` if never."""
+    synced = cache.get(SYNCED_KEY.format(alias))
+    return None if synced is None else time.time() - synced
+
+
+def healthy_replicas():
+    """Replicas within the allowed lag, rechecked once per interval."""
+    now = time.monotonic()
+    replicas = tuple(settings.DATABASE_REPLICAS)
+    if (replicas != _health['replicas'] or now - _health['checked']
+            >= settings.REPLICA_HEALTH_CHECK_INTERVAL):
+        lags = {alias: replica_lag(alias) for alias in replicas}
+        _health.update(checked=now, replicas=replicas, aliases=tuple(
+            alias for alias, lag in lags.items()
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG))
+    return _health['aliases']
+
+
+def pin_primary():
+    _state.pinned = True
+
+
+@contextmanager
+def use_primary():
+    """Send every query of the block to the primary."""
+    pinned = getattr(_state, 'pinned', False)
+    _state.pinned = True
+    try:
+        yield
+    finally:
+        _state.pinned = pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Commands and background tasks read back what they have just
+        # written, so only requests are sent to replicas.
+        if (not getattr(_state, 'in_request', False)
+                or getattr(_state, 'pinned', False)
+                or model._meta.app_label in PRIMARY_APPS):
+            return PRIMARY
+        replica = getattr(_state, 'replica', None)
+        if replica is None:
+            replicas = healthy_replicas()
+            replica = random.choice(replicas) if replicas else PRIMARY
+            # One replica per request keeps its reads consistent.
+            _state.replica = replica
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive the schema along with the data.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Keeps a user on the primary for a while after they write.
+
+    Requests with unsafe methods count as writes; views that write on GET
+    are marked with ``read_your_writes``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.writes_primary = request.method not in (
+            'GET', 'HEAD', 'OPTIONS', 'TRACE')
+        _state.in_request = True
+        _state.replica = None
+        _state.pinned = (
+            request.writes_primary or PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.in_request = _state.pinned = False
+            _state.replica = None
+        if request.writes_primary and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+
+def read_your_writes(view_func):
+    """Run the view on the primary and pin the user there afterwards."""
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        request.writes_primary = True
+        pin_primary()
+        return view_func(request, *args, **kwargs)
+    return wrapped_view
@@ -0,0 +1,54 @@
+"""Background task runner for work kept off the request path."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .replicas import use_primary
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TASKS_MAX_WORKERS,
+            thread_name_prefix='yatube-task',
+        )
+    return _executor
+
+
+def wait_for_tasks():
+    """Block until queued tasks finish; the pool restarts on next use."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _run(func, args, kwargs):
+    try:
+        # Tasks follow up on fresh writes a replica may not have yet.
+        with use_primary():
+            func(*args, **kwargs)
+    except Exception:
+        logger.exception('Task %s failed', func.__name__)
+    finally:
+        connections.close_all()
+
+
+def run_async(func, *args, **kwargs):
+    """Run ``func`` in the worker pool once the current transaction commits.
+
+    With ``TASKS_ALWAYS_EAGER`` the task runs inline, which keeps tests
+    deterministic.
+    """
+    if settings.TASKS_ALWAYS_EAGER:
+        return func(*args, **kwargs)
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, func, args, kwargs)
+    )
@@ -0,0 +1,22 @@
+"""Test helpers shared by the apps."""
+from urllib.parse import urlsplit
+
+from django.test.client import Client
+from django.urls import resolve
+
+from .queries import record_queries
+
+
+class QueryBudgetMixin:
+    """``TestCase`` helper checking a page against its view's budget."""
+
+    def assertQueryBudget(self, url, client=None, budget=None):
+        client = client or getattr(self, 'client', None) or Client()
+        if budget is None:
+            budget = getattr(
+                resolve(urlsplit(url).path).func, 'query_budget', None)
+        with record_queries() as log:
+            response = client.get(url)
+        self.assertLess(response.status_code, 400)
+        self.assertFalse(log.problems(budget), url)
+        return log
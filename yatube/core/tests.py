@@ -1,7 +1,345 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.cache import get_cache_key
+
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts.models import Post, User
+
+from .benchmarks import Sample, find_regressions, measure, summarize
+from .cache import (LOCK_KEY, STATS_KEY, acquire_lock, bump_version,
+                    cache_page_versioned, flush_stats, get_stats,
+                    record_lookup, release_lock, single_flight)
+from .cache_backends import TieredCache
+from .db import get_pragmas
+from .loadtest import encode_multipart, time_series
+from .replicas import (PIN_COOKIE, SYNCED_KEY, ReplicaPinMiddleware,
+                       ReplicaRouter, mark_synced, use_primary)
+from .thumbnail_kvstore import KVStore
 
 
 class ViewTestClass(TestCase):
     def test_error_page(self):
         response = self.client.get('/nonexist-page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(CACHE_LOCK_TIMEOUT=0.1, CACHE_LOCK_POLL_INTERVAL=0.01)
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_expired_entry_served_while_locked(self):
+        """Пока значение пересчитывает другой воркер, отдаётся старое."""
+        self.assertEqual(single_flight('key', lambda: 'old', 0), 'old')
+        acquire_lock('key')
+        self.assertEqual(single_flight('key', lambda: 'new', 0), 'old')
+        cache.delete(LOCK_KEY.format('key'))
+        self.assertEqual(single_flight('key', lambda: 'new', 60), 'new')
+
+    def test_index_served_stale_while_rebuilding(self):
+        """Главная отдаёт прошлую копию, пока другой запрос её строит."""
+        user = User.objects.create_user(username='author')
+        Post.objects.create(author=user, text='Первый пост')
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=user, text='Второй пост')
+        lock = self.page_lock(url)
+        acquire_lock(lock)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Второй пост')
+        self.assertEqual(get_stats('index_page')['stale'], 1)
+        release_lock(lock)
+        bump_version('index_page')
+        self.assertContains(self.client.get(url), 'Второй пост')
+
+    def page_lock(self, url, client=None):
+        """Lock of the cached index page variant a client would get."""
+        cookies = '; '.join(sorted(
+            f'{morsel.key}={morsel.coded_value}'
+            for morsel in (client or self.client).cookies.values()))
+        request = RequestFactory().get(url, HTTP_COOKIE=cookies)
+        key = get_cache_key(request, 'index_page.stale', 'GET', cache=cache)
+        return f'index_page:{key or url}'
+
+    @override_settings(CACHE_LOCK_TIMEOUT=3)
+    def test_variants_rendered_independently(self):
+        """Запрос с другими cookie не ждёт чужую копию страницы."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        other = Client()
+        other.force_login(User.objects.create_user(username='reader'))
+        bump_version('index_page')
+        acquire_lock(self.page_lock(url))
+        started = time.monotonic()
+        self.assertEqual(other.get(url).status_code, 200)
+        self.assertLess(time.monotonic() - started, 1)
+        # Without a copy of its own a request waits for its own variant,
+        # but only until the lock is released.
+        third = Client()
+        third.force_login(User.objects.create_user(username='newcomer'))
+        own_lock = self.page_lock(url, third)
+        acquire_lock(own_lock)
+        started = time.monotonic()
+        threading.Timer(0.2, release_lock, [own_lock]).start()
+        self.assertEqual(third.get(url).status_code, 200)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    @override_settings(CACHE_STATS_FLUSH_INTERVAL=60)
+    def test_stats_written_in_batches(self):
+        """Счётчики попаданий копятся в процессе и пишутся в кеш пачкой."""
+        flush_stats()
+        for _ in range(3):
+            record_lookup('index_page', 'hits')
+        self.assertIsNone(cache.get(STATS_KEY.format('index_page', 'hits')))
+        self.assertEqual(get_stats('index_page')['hits'], 3)
+
+
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        params = {'OPTIONS': {'L1_MAX_ENTRIES': 2}}
+        self.worker = TieredCache(self.location, params)
+        self.other_worker = TieredCache(self.location, params)
+
+    def test_entries_shared_between_workers(self):
+        """Запись одного воркера видна другому."""
+        self.worker.set('key', {'value': 1})
+        self.assertEqual(self.other_worker.get('key'), {'value': 1})
+
+    def test_write_invalidates_other_l1(self):
+        """Запись сбрасывает L1 в остальных воркерах."""
+        self.worker.set('key', 'old')
+        self.assertEqual(self.other_worker.get('key'), 'old')
+        self.worker.set('key', 'new')
+        self.assertEqual(self.other_worker.get('key'), 'new')
+        self.worker.delete('key')
+        self.assertIsNone(self.other_worker.get('key'))
+
+    def test_clear_invalidates_other_l1(self):
+        """Очистка кеша сбрасывает L1 во всех воркерах."""
+        self.worker.set('key', 'value')
+        self.other_worker.get('key')
+        self.worker.clear()
+        self.assertIsNone(self.other_worker.get('key'))
+
+    def test_l1_is_bounded(self):
+        """L1 хранит не больше заданного числа записей."""
+        self.worker.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(
+            self.worker.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(len(self.worker._l1), 2)
+
+    def test_add_incr_and_expiry(self):
+        """add и incr атомарны, просроченные записи не отдаются."""
+        self.assertTrue(self.worker.add('lock', 1))
+        self.assertFalse(self.other_worker.add('lock', 1))
+        self.assertEqual(self.other_worker.incr('lock', 2), 3)
+        self.assertEqual(self.worker.get('lock'), 3)
+        with self.assertRaises(ValueError):
+            self.worker.incr('missing')
+        self.worker.set('short', 'value', timeout=-1)
+        self.assertIsNone(self.worker.get('short'))
+        self.assertTrue(self.worker.add('short', 'again'))
+
+
+class ThumbnailKVStoreTest(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        path = f'{location}/thumbnails.sqlite3'
+        with self.settings(THUMBNAIL_KVSTORE_PATH=path):
+            self.worker = KVStore()
+            self.other_worker = KVStore()
+
+    def count_selects(self, store):
+        selects = []
+        store._connection().set_trace_callback(
+            lambda sql: sql.startswith('SELECT') and selects.append(sql))
+        return selects
+
+    def test_records_shared_between_workers(self):
+        """Запись одного воркера видна другому, удаление тоже."""
+        self.worker._set_raw('key', 'value')
+        self.assertEqual(self.other_worker._get_raw('key'), 'value')
+        self.worker._delete_raw('key')
+        self.assertIsNone(self.other_worker._get_raw('key'))
+
+    def test_prefetch_loads_page_in_two_queries(self):
+        """Предзагрузка страницы — два запроса, дальше только память."""
+        sources = [ImageFile(f'posts/{name}.jpg') for name in 'abc']
+        for source in sources:
+            thumbnail = f'{source.key}-thumbnail'
+            self.worker._set_raw(add_prefix(source.key), 'source')
+            self.worker._set_raw(add_prefix(thumbnail), 'thumbnail')
+            self.worker._set(source.key, [thumbnail], identity='thumbnails')
+        selects = self.count_selects(self.other_worker)
+        self.other_worker.prefetch(source.name for source in sources)
+        self.assertEqual(len(selects), 2)
+        for source in sources:
+            self.assertEqual(
+                self.other_worker._get_raw(
+                    add_prefix(f'{source.key}-thumbnail')),
+                'thumbnail')
+        self.assertEqual(len(selects), 2)
+
+
+class SQLiteTuningTest(TestCase):
+    def test_new_connection_is_tuned(self):
+        """Новое соединение с файлом базы получает WAL и прагмы."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        default = connections['default']
+        settings_dict = {
+            **default.settings_dict, 'NAME': f'{location}/db.sqlite3'}
+        other = type(default)(settings_dict, alias='tuning')
+        self.addCleanup(other.close)
+        self.assertEqual(get_pragmas(other), {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'cache_size': -64 * 1024,
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 2,
+        })
+
+
+@override_settings(DATABASE_REPLICAS=('replica',),
+                   REPLICA_HEALTH_CHECK_INTERVAL=0)
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user(username='author')
+
+    def read_in_request(self, reads=None):
+        """Database of a read made while a request is handled."""
+        seen = []
+        middleware = ReplicaPinMiddleware(lambda request: seen.append(
+            (reads or (lambda: self.router.db_for_read(Post)))()))
+        middleware(RequestFactory().get('/'))
+        return seen[0]
+
+    def test_reads_go_to_synced_replica(self):
+        """Чтение уходит на свежую реплику, запись — на основную базу."""
+        self.assertEqual(self.read_in_request(), 'default')
+        mark_synced('replica')
+        self.assertEqual(self.read_in_request(), 'replica')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+        def read_on_primary():
+            with use_primary():
+                return self.router.db_for_read(Post)
+
+        self.assertEqual(self.read_in_request(read_on_primary), 'default')
+
+    def test_reads_outside_requests_use_primary(self):
+        """Команды и фоновые задачи читают с основной базы."""
+        mark_synced('replica')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_lagging_replica_skipped(self):
+        """Отставшая реплика не используется."""
+        with self.settings(REPLICA_MAX_LAG=5):
+            cache.set(SYNCED_KEY.format('replica'), 0, None)
+            self.assertEqual(self.read_in_request(), 'default')
+
+    def test_writer_pinned_to_primary(self):
+        """После своей записи пользователь читает с основной базы."""
+        mark_synced('replica')
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        other = User.objects.create_user(username='other')
+        response = self.client.get(
+            reverse('posts:profile_follow', args=[other]))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_cached_page_rendered_from_primary(self):
+        """Страница для кеша строится по основной базе, а не по реплике."""
+        mark_synced('replica')
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse('page')
+
+        middleware = ReplicaPinMiddleware(
+            cache_page_versioned(60, 'replica_page')(view))
+        middleware(RequestFactory().get('/page/'))
+        self.assertEqual(seen, ['default'])
+        self.assertEqual(self.read_in_request(), 'replica')
+
+    def test_pin_cookie_routes_request_to_primary(self):
+        """Запрос с меткой записи читает с основной базы."""
+        mark_synced('replica')
+        seen = []
+        middleware = ReplicaPinMiddleware(
+            lambda request: seen.append(self.router.db_for_read(Post)))
+        factory = RequestFactory()
+        request = factory.get('/')
+        middleware(request)
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, ['replica', 'default'])
+
+
+class BenchmarkTest(TestCase):
+    def test_measure_counts_queries_and_rendering(self):
+        """Замер считает запросы к базе и время шаблонов."""
+        user = User.objects.create_user(username='author')
+        Post.objects.create(author=user, text='Пост')
+        sample = measure(lambda: self.client.get(
+            reverse('posts:profile', args=[user])))
+        self.assertTrue(sample.ok)
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.render_time, 0)
+        self.assertLess(sample.render_time, sample.elapsed)
+
+    def test_regressions_against_baseline(self):
+        """Рост задержки сверх порога и числа запросов — регрессия."""
+        baseline = {'10k': {'index': summarize(
+            [Sample(0.010, 2, 0.001, 0.005, True)] * 10)}}
+        same = {'10k': {'index': summarize(
+            [Sample(0.011, 2, 0.001, 0.005, True)] * 10)}}
+        slower = {'10k': {'index': summarize(
+            [Sample(0.020, 3, 0.001, 0.005, True)] * 10)}}
+        self.assertEqual(find_regressions(same, baseline, 0.25), [])
+        self.assertEqual(len(find_regressions(slower, baseline, 0.25)), 3)
+        self.assertEqual(find_regressions(slower, {}, 0.25), [])
+
+
+class LoadTestTest(TestCase):
+    def test_time_series_buckets_samples(self):
+        """Замеры делятся на интервалы со своей пропускной способностью."""
+        samples = [(0.5, 'index', 0.010, None), (1.5, 'index', 0.030, None),
+                   (2.5, 'post', 0.050, 'status')]
+        series = list(time_series(samples, 2, 3))
+        self.assertEqual([start for start, _ in series], [0, 2])
+        first, last = series[0][1], series[1][1]
+        self.assertEqual(first['requests'], 2)
+        self.assertEqual(first['throughput'], 1)
+        self.assertEqual(first['error_rate'], 0)
+        self.assertEqual(last['throughput'], 1)
+        self.assertEqual(last['error_rate'], 1)
+
+    def test_multipart_body_is_parsed_by_django(self):
+        """Тело multipart-запроса разбирается как форма с файлом."""
+        body, content_type = encode_multipart(
+            {'text': 'Пост'}, {'image': ('a.gif', b'GIF89a', 'image/gif')})
+        request = RequestFactory().generic(
+            'POST', '/', body, content_type=content_type)
+        self.assertEqual(request.POST['text'], 'Пост')
+        self.assertEqual(request.FILES['image'].read(), b'GIF89a')
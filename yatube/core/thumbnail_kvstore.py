@@ -0,0 +1,144 @@
+"""sorl-thumbnail key-value store in a local SQLite file.
+
+sorl's default store keeps thumbnail records in the main database and
+reads them one image at a time. This one keeps them in a side database
+shared by the workers of the machine, behind an in-process LRU, and can
+load the records of a whole page of images with one query.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+SQL_BATCH_SIZE = 500
+PREFIX_END = '\U0010ffff'
+
+
+class KVStore(KVStoreBase):
+    def __init__(self):
+        super().__init__()
+        self._path = settings.THUMBNAIL_KVSTORE_PATH
+        self._max_entries = settings.THUMBNAIL_KVSTORE_LRU_SIZE
+        self._lru = OrderedDict()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._pid = None
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                self._lru.clear()
+                self._local = threading.local()
+                self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=30,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS thumbnail_kvstore ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.data_version = None
+        self._sync(conn)
+        return conn
+
+    def _sync(self, conn):
+        """Forget cached records once another connection has committed."""
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._local.data_version:
+            if self._local.data_version is not None:
+                with self._lock:
+                    self._lru.clear()
+            self._local.data_version = data_version
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._max_entries:
+                self._lru.popitem(last=False)
+
+    def _get_many_raw(self, keys):
+        conn = self._connection()
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                else:
+                    missing.append(key)
+        for start in range(0, len(missing), SQL_BATCH_SIZE):
+            batch = missing[start:start + SQL_BATCH_SIZE]
+            rows = conn.execute(
+                'SELECT key, value FROM thumbnail_kvstore '
+                f'WHERE key IN ({",".join("?" * len(batch))})',
+                batch,
+            ).fetchall()
+            for key, value in rows:
+                self._remember(key, value)
+                found[key] = value
+        return found
+
+    def prefetch(self, files):
+        """Load the records of ``files`` and of all their thumbnails.
+
+        Costs at most two queries however many files are given, so the
+        ``{% thumbnail %}`` calls of a page are served from memory.
+        """
+        sources = [ImageFile(file_) for file_ in files if file_]
+        lists = self._get_many_raw(
+            [add_prefix(source.key, 'thumbnails') for source in sources])
+        keys = [add_prefix(source.key) for source in sources]
+        for value in lists.values():
+            keys.extend(add_prefix(key) for key in deserialize(value))
+        self._get_many_raw(keys)
+
+    def _get_raw(self, key):
+        return self._get_many_raw([key]).get(key)
+
+    def _set_raw(self, key, value):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO thumbnail_kvstore (key, value) '
+            'VALUES (?, ?)',
+            (key, value),
+        )
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'DELETE FROM thumbnail_kvstore WHERE key = ?',
+                ((key,) for key in keys),
+            )
+        with self._lock:
+            for key in keys:
+                self._lru.pop(key, None)
+
+    def _find_keys_raw(self, prefix, after=None, limit=None):
+        """Keys starting with ``prefix`` in order, optionally one page.
+
+        ``after`` and ``limit`` let long scans resume from the last key.
+        """
+        conn = self._connection()
+        if after is not None and after >= prefix:
+            condition, lower = 'key > ?', after
+        else:
+            condition, lower = 'key >= ?', prefix
+        return [row[0] for row in conn.execute(
+            f'SELECT key FROM thumbnail_kvstore WHERE {condition} '
+            'AND key < ? ORDER BY key LIMIT ?',
+            (lower, prefix + PREFIX_END, -1 if limit is None else limit),
+        )]
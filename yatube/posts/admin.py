@@ -1,10 +1,29 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
+from . import search
 from .models import Group, Post, Comment, Follow
 
 
+class FullTextSearchMixin:
+    """Changelist search through the FTS5 index instead of LIKE scans."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        ids = search.matching_ids(
+            self.model, search_term, search.ADMIN_RESULTS_LIMIT)
+        if len(ids) == search.ADMIN_RESULTS_LIMIT:
+            self.message_user(
+                request,
+                f'Показаны {search.ADMIN_RESULTS_LIMIT} лучших совпадений, '
+                'уточните запрос, чтобы увидеть остальные.',
+                messages.WARNING)
+        return queryset.filter(pk__in=ids), False
+
+
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
     search_fields = ('text',)
@@ -20,7 +39,7 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created',)
     search_fields = ('text', 'post',)
     list_filter = ('created',)
@@ -0,0 +1,71 @@
+"""Reference counting of stored post images.
+
+``ContentAddressedStorage`` lets posts share one file, so a file may be
+removed only when the last post using it lets go. Uploads are counted by
+the storage itself when the file is saved, other image names when the
+post referring to them is.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from sorl.thumbnail import delete
+
+from core.tasks import run_async
+
+from .models import Blob, Post
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    blob, created = Blob.objects.get_or_create(
+        name=name, defaults={'refcount': 1})
+    if not created:
+        Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+
+
+def release(name):
+    """Drop one reference; the last one removes the file in the background."""
+    Blob.objects.filter(name=name).update(
+        refcount=Greatest(F('refcount') - 1, 0))
+    deleted, _ = Blob.objects.filter(name=name, refcount=0).delete()
+    if deleted:
+        run_async(delete_file, name)
+
+
+def delete_file(name):
+    """Remove the file and its thumbnails unless it was uploaded again.
+
+    Runs under the storage lock: an upload of the same content either
+    acquires the name first or finds the file gone and writes it anew.
+    """
+    field = Post._meta.get_field('image')
+    with field.storage.lock():
+        if Blob.objects.filter(name=name).exists():
+            return
+        try:
+            delete(field.attr_class(None, field, name))
+        except (OSError, SuspiciousFileOperation):
+            logger.warning('Could not delete %s', name)
+
+
+def rebuild_refcounts():
+    """Recount the posts using each image; returns the fixed count.
+
+    Records of files no post uses are dropped, leaving the files to the
+    media collector.
+    """
+    fixed = 0
+    images = Post.objects.exclude(image='').order_by().values_list(
+        'image').annotate(total=Count('pk'))
+    for name, total in images.iterator():
+        blob, created = Blob.objects.get_or_create(
+            name=name, defaults={'refcount': total})
+        if created or blob.refcount != total:
+            Blob.objects.filter(pk=blob.pk).update(refcount=total)
+            fixed += 1
+    unused, _ = Blob.objects.exclude(
+        name__in=Post.objects.values('image')).delete()
+    return fixed + unused
@@ -0,0 +1,85 @@
+"""Pure-Python BlurHash encoder.
+
+Implements the reference algorithm from https://blurha.sh: a few DCT
+components of the image in linear RGB, quantized into a short base83
+string that clients decode into a blurred placeholder.
+"""
+import math
+
+BASE83 = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+          'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~')
+
+
+def base83(value, length):
+    return ''.join(
+        BASE83[value // 83 ** (length - position - 1) % 83]
+        for position in range(length)
+    )
+
+
+def srgb_to_linear(value):
+    value /= 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def _factors(pixels, width, height, x_components, y_components):
+    linear = [tuple(srgb_to_linear(channel) for channel in pixel[:3])
+              for pixel in pixels]
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            red = green = blue = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    r, g, b = linear[row + x]
+                    red += basis * r
+                    green += basis * g
+                    blue += basis * b
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+    return factors
+
+
+def encode(pixels, width, height, x_components=4, y_components=3):
+    """BlurHash of ``pixels``, a row-major sequence of RGB(A) tuples.
+
+    Pass a small copy of the image: the cost grows with the pixel count
+    times the number of components.
+    """
+    factors = _factors(pixels, width, height, x_components, y_components)
+    dc, ac = factors[0], factors[1:]
+    result = base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        largest = max(abs(channel) for factor in ac for channel in factor)
+        quantized = max(0, min(82, int(largest * 166 - 0.5)))
+        maximum = (quantized + 1) / 166
+        result += base83(quantized, 1)
+    else:
+        maximum = 1
+        result += base83(0, 1)
+    r, g, b = (linear_to_srgb(channel) for channel in dc)
+    result += base83((r << 16) + (g << 8) + b, 4)
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, int(sign_pow(channel / maximum, 0.5) * 9 + 9.5)))
+            for channel in factor
+        )
+        result += base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
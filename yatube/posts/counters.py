@@ -0,0 +1,70 @@
+"""Denormalized counters for authors, groups and posts."""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Group, Post, User, UserCounters
+
+COUNTERS = (
+    (Group, 'posts_count', 'posts'),
+    (Post, 'comments_count', 'comments'),
+    (UserCounters, 'posts_count', 'user__posts'),
+    (UserCounters, 'followers_count', 'user__following'),
+    (UserCounters, 'following_count', 'user__follower'),
+)
+
+
+def _shift(queryset, **deltas):
+    return queryset.update(**{
+        name: Greatest(F(name) + delta, 0)
+        for name, delta in deltas.items()
+    })
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def change_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def change_user(user_id, **deltas):
+    """Atomically shift the user's counters, creating the row on demand."""
+    counters = UserCounters.objects.filter(pk=user_id)
+    if _shift(counters, **deltas) or min(deltas.values()) < 0:
+        return
+    UserCounters.objects.get_or_create(user_id=user_id)
+    _shift(counters, **deltas)
+
+
+def get_counters(user):
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        return UserCounters.objects.get_or_create(user=user)[0]
+
+
+@transaction.atomic
+def rebuild_counters():
+    """Recount every counter and fix those that drifted.
+
+    Runs in one transaction, so readers never see a half-fixed set of
+    counters. Returns the number of corrected values per counter.
+    """
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=pk) for pk in User.objects.filter(
+            counters__isnull=True).values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    fixed = {}
+    for model, field, relation in COUNTERS:
+        drifted = model.objects.order_by().annotate(
+            actual=Count(relation)
+        ).exclude(**{field: F('actual')}).values_list('pk', 'actual')
+        fixed[f'{model.__name__}.{field}'] = 0
+        for pk, actual in drifted.iterator():
+            model.objects.filter(pk=pk).update(**{field: actual})
+            fixed[f'{model.__name__}.{field}'] += 1
+    return fixed
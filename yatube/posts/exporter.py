@@ -0,0 +1,145 @@
+"""Streaming export of posts and comments.
+
+Rows are read in keyset batches ordered by id and formatted one at a
+time, so an export of any size runs in constant memory. Records use the
+layout ``import_content`` reads, which makes an export re-importable.
+"""
+import csv
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import Comment, Post
+from .paginator import seek
+
+POST_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+CSV_COLUMNS = ('type', 'id', 'post', 'author', 'group', 'text',
+               'pub_date', 'created', 'image')
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+GZIP_CHUNK_SIZE = 64 * 1024
+# Walks post_author_pub_date_idx and post_group_pub_date_idx.
+POST_ORDERING = ('-pub_date', '-id')
+
+
+def keyset_batches(queryset, fields, batch_size, ordering=('-id',)):
+    """Rows of ``queryset`` as dicts, ``batch_size`` at a time.
+
+    Each batch seeks past the last row on ``ordering``, which should
+    match an index so no batch costs more than the first.
+    """
+    queryset = queryset.order_by(*ordering).values_list(*fields.values())
+    page = queryset
+    while True:
+        batch = [dict(zip(fields, row)) for row in page[:batch_size]]
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        page = queryset.filter(seek(ordering, [
+            batch[-1][field.lstrip('-')] for field in ordering]))
+
+
+def _records(kind, rows):
+    for row in rows:
+        yield {'type': kind, **row}
+
+
+def export_records(author=None, group=None, batch_size=None):
+    """Posts and comments of an author, or of a group's posts.
+
+    Posts come newest first. A group's comments follow each batch of
+    its posts and are read through the comment index.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    posts = Post.objects.filter(
+        **({'author': author} if author is not None else {'group': group}))
+    for batch in keyset_batches(
+            posts, POST_FIELDS, batch_size, POST_ORDERING):
+        yield from _records('post', batch)
+        if author is None:
+            comments = Comment.objects.filter(
+                post_id__in=[row['id'] for row in batch]
+            ).order_by().values_list(*COMMENT_FIELDS.values())
+            yield from _records('comment', (
+                dict(zip(COMMENT_FIELDS, row))
+                for row in comments.iterator(chunk_size=batch_size)))
+    if author is not None:
+        comments = Comment.objects.filter(author=author)
+        for batch in keyset_batches(comments, COMMENT_FIELDS, batch_size):
+            yield from _records('comment', batch)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(
+            record, ensure_ascii=False, default=_isoformat) + '\n'
+
+
+class _Line:
+    """File-like object handing back what ``csv.writer`` writes."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(_Line(), CSV_COLUMNS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow({
+            key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in record.items()
+        })
+
+
+def encode(lines, compress=False):
+    """UTF-8 chunks of ``lines``, gzipped on the fly if ``compress``.
+
+    Lines are grouped into chunks of about ``GZIP_CHUNK_SIZE`` bytes.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= GZIP_CHUNK_SIZE:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compress else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compress:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_stream(file_format, compress=False, **filters):
+    """Encoded chunks of an export in ``file_format``."""
+    records = export_records(**filters)
+    lines = (csv_lines if file_format == 'csv' else ndjson_lines)(records)
+    return encode(lines, compress)
@@ -1,6 +1,7 @@
 from django import forms
 
-from .models import Comment, Post
+from .models import Comment, Group, Post, User
+from .uploads import verify_upload
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +14,16 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка',
         }
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if hasattr(image, 'temporary_file_path'):
+            verify_upload(image.temporary_file_path())
+        return image
+
     def clean(self):
         super(PostForm, self).clean()
         text = self.cleaned_data.get('text')
@@ -20,6 +31,9 @@ class PostForm(forms.ModelForm):
             self._errors['text'] = self.error_class([
                 'А кто поле будет заполнять? Пушкин?'
             ])
+        for field, message in self.upload_errors.items():
+            if field in self.fields:
+                self.add_error(field, message)
         return self.cleaned_data
 
 
@@ -36,3 +50,29 @@ class CommentForm(forms.ModelForm):
                 'А кто поле будет заполнять? Пушкин?'
             ])
         return self.cleaned_data
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Что ищем', max_length=200)
+    scope = forms.ChoiceField(
+        label='Где искать',
+        choices=(('posts', 'В постах'), ('comments', 'В комментариях')),
+        required=False,
+    )
+    group = forms.ModelChoiceField(
+        label='Группа',
+        queryset=Group.objects.all(),
+        required=False,
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
+
+    def clean_author(self):
+        """Primary key of the author named in the field, if any."""
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        author = User.objects.filter(
+            username=username).values_list('pk', flat=True).first()
+        if author is None:
+            raise forms.ValidationError('Такого автора нет.')
+        return author
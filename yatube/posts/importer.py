@@ -0,0 +1,258 @@
+"""Streaming bulk import of users, groups, posts, comments and follows.
+
+Records are read one at a time and buffered per type; a full buffer is
+written with one ``bulk_create``, after the buffers it depends on, so
+memory stays bounded by the batch size plus the username and slug maps.
+``bulk_create`` sends no signals: counters, timelines, the search index
+and image references are rebuilt once at the end instead.
+
+Every record carries a ``type``. Users are keyed by ``username`` and
+groups by ``slug``; posts and comments may give their ``id``, which is
+kept, so comments can refer to imported posts and a rerun skips rows
+that are already there.
+"""
+import csv
+import json
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_version
+
+from . import blobs, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('user', 'group', 'post', 'comment', 'follow')
+DEPENDENCIES = {
+    'user': (),
+    'group': (),
+    'post': ('user', 'group'),
+    'comment': ('user', 'post'),
+    'follow': ('user',),
+}
+MODELS = {
+    'user': User,
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+# Auto-filled dates are turned off while importing to keep the source's.
+DATE_FIELDS = ((Post, 'pub_date'), (Post, 'updated'), (Comment, 'created'))
+
+
+def read_records(stream, file_format, skip=None):
+    """Records from a JSON Lines or CSV stream, one at a time.
+
+    A JSON line that is not an object is left out and passed to ``skip``
+    as ``Importer.skip`` takes it, with its line number as the record.
+    """
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if value != ''}
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            record, reason = None, error
+        else:
+            reason = f'not an object: {type(record).__name__}'
+        if isinstance(record, dict):
+            yield record
+        elif skip is not None:
+            skip('?', f'line {number}', reason)
+        else:
+            logger.warning('Skipped line %s: %s', number, reason)
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'bad date {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+@contextmanager
+def source_dates():
+    fields = [model._meta.get_field(name) for model, name in DATE_FIELDS]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    def __init__(self, batch_size=1000, transaction_size=20000):
+        self.batch_size = batch_size
+        self.transaction_size = transaction_size
+        self.buffers = {kind: [] for kind in KINDS}
+        self.users = {}
+        self.groups = {}
+        self.posts = set()
+        self.read = Counter()
+        self.skipped = Counter()
+
+    def run(self, records):
+        records = iter(records)
+        with source_dates():
+            while True:
+                chunk = list(islice(records, self.transaction_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    for record in chunk:
+                        self.add(record)
+                    self.flush_all()
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in self.buffers:
+            self.skip(kind or '?', record, 'unknown type')
+            return
+        self.read[kind] += 1
+        self.buffers[kind].append(record)
+        if len(self.buffers[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def skip(self, kind, record, reason):
+        self.skipped[kind] += 1
+        logger.warning('Skipped %s %s: %s', kind, record, reason)
+
+    def flush_all(self):
+        for kind in KINDS:
+            self.flush(kind)
+
+    def flush(self, kind):
+        for dependency in DEPENDENCIES[kind]:
+            self.flush(dependency)
+        records, self.buffers[kind] = self.buffers[kind], []
+        if not records:
+            return
+        objects = []
+        self.before_build(kind, records)
+        for record in records:
+            try:
+                objects.append(getattr(self, f'build_{kind}')(record))
+            except (KeyError, TypeError, ValueError) as error:
+                self.skip(kind, record, error)
+        # Django picks the largest statement the backend accepts.
+        MODELS[kind].objects.bulk_create(objects, ignore_conflicts=True)
+        self.after_create(kind, records)
+
+    # Key maps.
+
+    def before_build(self, kind, records):
+        keys = {
+            'post': [('author', self.users, User, 'username'),
+                     ('group', self.groups, Group, 'slug')],
+            'comment': [('author', self.users, User, 'username')],
+            'follow': [('user', self.users, User, 'username'),
+                       ('author', self.users, User, 'username')],
+        }
+        for field, mapping, model, key in keys.get(kind, ()):
+            self.load(mapping, model, key,
+                      {record[field] for record in records
+                       if record.get(field)})
+        if kind == 'comment':
+            ids = {int(record['post']) for record in records
+                   if str(record.get('post', '')).isdigit()}
+            self.posts = set(Post.objects.filter(
+                pk__in=ids).values_list('pk', flat=True))
+
+    def after_create(self, kind, records):
+        if kind == 'user':
+            self.load(self.users, User, 'username',
+                      {record.get('username') for record in records})
+        elif kind == 'group':
+            self.load(self.groups, Group, 'slug',
+                      {record.get('slug') for record in records})
+
+    def load(self, mapping, model, key, values):
+        """Add the pks of ``values`` that are not in ``mapping`` yet."""
+        missing = [value for value in values if value not in mapping]
+        for start in range(0, len(missing), self.batch_size):
+            mapping.update(model.objects.filter(**{
+                f'{key}__in': missing[start:start + self.batch_size]
+            }).values_list(key, 'pk'))
+
+    # Records.
+
+    def build_user(self, record):
+        return User(
+            username=record['username'],
+            first_name=record.get('first_name', ''),
+            last_name=record.get('last_name', ''),
+            email=record.get('email', ''),
+            password=make_password(None),
+            date_joined=parse_date(record.get('date_joined')),
+        )
+
+    def build_group(self, record):
+        return Group(
+            slug=record['slug'],
+            title=record['title'],
+            description=record.get('description', ''),
+        )
+
+    def build_post(self, record):
+        group = record.get('group')
+        pub_date = parse_date(record.get('pub_date'))
+        return Post(
+            id=record.get('id'),
+            author_id=self.users[record['author']],
+            group_id=self.groups[group] if group else None,
+            text=record['text'],
+            image=record.get('image', ''),
+            pub_date=pub_date,
+            updated=pub_date,
+        )
+
+    def build_comment(self, record):
+        post_id = int(record['post'])
+        if post_id not in self.posts:
+            raise ValueError(f'no post {post_id}')
+        return Comment(
+            id=record.get('id'),
+            post_id=post_id,
+            author_id=self.users[record['author']],
+            text=record['text'],
+            created=parse_date(record.get('created')),
+        )
+
+    def build_follow(self, record):
+        user_id = self.users[record['user']]
+        author_id = self.users[record['author']]
+        if user_id == author_id:
+            raise ValueError('self-follow')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    # Derived data.
+
+    def rebuild(self):
+        """Recompute everything the skipped signals would have kept."""
+        counters.rebuild_counters()
+        timeline.rebuild_timelines()
+        if search.is_available():
+            search.rebuild_index()
+        blobs.rebuild_refcounts()
+        for namespace in ('index_page', 'post_cards', 'follows', 'timelines'):
+            bump_version(namespace)
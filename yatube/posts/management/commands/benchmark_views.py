@@ -0,0 +1,218 @@
+import os
+import random
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.benchmarks import (find_regressions, load_baseline, measure,
+                             save_baseline, summarize)
+from core.tasks import wait_for_tasks
+from posts.models import Comment, Group, Post, User
+
+SCALES = ('10k', '100k', '1m')
+SUFFIXES = {'k': 1000, 'm': 1000 * 1000}
+# Writes come last so they do not invalidate the caches of the reads.
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+         'post_create', 'add_comment')
+POST_TEXT = 'Пост для замеров'
+COMMENT_TEXT = 'Комментарий для замеров'
+LOGGED_IN_USERS = 20
+
+
+def parse_scale(scale):
+    """Number of posts in a scale such as ``10k`` or ``1m``."""
+    multiplier = SUFFIXES.get(scale[-1:].lower(), 1)
+    number = scale[:-1] if multiplier > 1 else scale
+    if not number.isdigit():
+        raise CommandError(f'Неверный масштаб: {scale}')
+    return int(number) * multiplier
+
+
+def dataset_options(posts):
+    """Sizes of the generated dataset for ``posts`` posts.
+
+    Posts are spread evenly over authors: with prolific authors also the
+    most followed, materialized timelines would grow with the square of
+    the scale.
+    """
+    return {
+        'users': max(100, posts // 20),
+        'groups': max(10, posts // 1000),
+        'posts': posts,
+        'comments': posts,
+        'follows_per_user': 10,
+        'author_exponent': 0,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the posts views through the test client on '
+            'generated datasets of several sizes; compare p50/p95 latency '
+            'and query counts with a saved baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', nargs='+', default=SCALES,
+            help='Dataset sizes in posts, e.g. 10k 100k 1m.')
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Measured requests per view.')
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Unmeasured requests per view first.')
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(settings.BASE_DIR, 'benchmarks'),
+            help='Datasets are generated here once and reused.')
+        parser.add_argument(
+            '--baseline', default=None,
+            help='Baseline JSON; defaults to baseline.json in --data-dir.')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Store the results as the baseline instead of comparing.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed latency growth as a fraction of the baseline.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes generating datasets.')
+
+    def handle(self, *args, **options):
+        data_dir = options['data_dir']
+        baseline_path = options['baseline'] or os.path.join(
+            data_dir, 'baseline.json')
+        results = {}
+        for scale in options['scales']:
+            posts = parse_scale(scale)
+            location = os.path.join(data_dir, scale)
+            with self.dataset(location):
+                self.prepare(location, posts, options)
+                results[scale] = self.benchmark(options)
+            self.report(scale, results[scale])
+        if options['save_baseline']:
+            save_baseline(baseline_path, results)
+            self.stdout.write(f'Базовая линия сохранена в {baseline_path}.')
+            return
+        baseline = load_baseline(baseline_path)
+        if baseline is None:
+            self.stdout.write('Базовой линии нет, сравнивать не с чем.')
+            baseline = {}
+        regressions = find_regressions(
+            results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                'Регрессия производительности:\n' + '\n'.join(regressions))
+        self.stdout.write('Регрессий нет.')
+
+    @contextmanager
+    def dataset(self, location):
+        """Point the database, media and cache at one dataset's files."""
+        os.makedirs(location, exist_ok=True)
+        database = connections['default']
+        name = database.settings_dict['NAME']
+        database.close()
+        database.settings_dict['NAME'] = os.path.join(location, 'db.sqlite3')
+        try:
+            with override_settings(
+                MEDIA_ROOT=os.path.join(location, 'media'),
+                CACHES={'default': {
+                    **settings.CACHES['default'],
+                    'LOCATION': os.path.join(location, 'cache'),
+                }},
+                DATABASE_REPLICAS=(),
+            ):
+                yield
+        finally:
+            wait_for_tasks()
+            database.close()
+            database.settings_dict['NAME'] = name
+
+    def prepare(self, location, posts, options):
+        """Generate the dataset unless a previous run completed it."""
+        marker = os.path.join(location, 'ready')
+        if not os.path.exists(marker):
+            connections['default'].close()
+            for suffix in ('', '-wal', '-shm'):
+                path = os.path.join(location, 'db.sqlite3' + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+            self.stdout.write(f'Создаём набор данных на {posts} постов...')
+            call_command('migrate', verbosity=0)
+            call_command(
+                'generate_dataset', seed=options['seed'],
+                workers=options['workers'], stdout=self.stdout,
+                **dataset_options(posts))
+            open(marker, 'w').close()
+        cache.clear()
+
+    def benchmark(self, options):
+        rng = random.Random(options['seed'])
+        last_user = User.objects.aggregate(last=Max('pk'))['last']
+        last_post = Post.objects.aggregate(last=Max('pk'))['last']
+        groups = list(Group.objects.values_list('pk', 'slug'))
+        clients = []
+        for user in User.objects.filter(pk__in=rng.sample(
+                range(1, last_user + 1), min(LOGGED_IN_USERS, last_user))):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        anonymous = Client()
+
+        def random_username():
+            return User.objects.filter(
+                pk__gte=rng.randint(1, last_user)
+            ).values_list('username', flat=True).first()
+
+        # Each target picks its URL and returns the request to measure.
+        targets = {
+            'index': lambda: partial(anonymous.get, reverse('posts:index')),
+            'group_posts': lambda: partial(anonymous.get, reverse(
+                'posts:group_list', args=[rng.choice(groups)[1]])),
+            'profile': lambda: partial(anonymous.get, reverse(
+                'posts:profile', args=[random_username()])),
+            'post_detail': lambda: partial(anonymous.get, reverse(
+                'posts:post_detail', args=[rng.randint(1, last_post)])),
+            'follow_index': lambda: partial(
+                rng.choice(clients).get, reverse('posts:follow_index')),
+            'post_create': lambda: partial(
+                rng.choice(clients).post, reverse('posts:post_create'),
+                {'text': POST_TEXT, 'group': rng.choice(groups)[0]}),
+            'add_comment': lambda: partial(
+                rng.choice(clients).post,
+                reverse('posts:add_comment',
+                        args=[rng.randint(1, last_post)]),
+                {'text': COMMENT_TEXT}),
+        }
+        results = {}
+        try:
+            for view in VIEWS:
+                samples = [
+                    measure(targets[view]())
+                    for _ in range(options['warmup'] + options['requests'])
+                ]
+                results[view] = summarize(samples[options['warmup']:])
+        finally:
+            wait_for_tasks()
+            Post.objects.filter(text=POST_TEXT).delete()
+            Comment.objects.filter(text=COMMENT_TEXT).delete()
+        return results
+
+    def report(self, scale, results):
+        self.stdout.write(f'{scale}:')
+        for view, summary in results.items():
+            self.stdout.write(
+                f'  {view}: p50 {summary["p50"]:.1f} мс, '
+                f'p95 {summary["p95"]:.1f} мс, '
+                f'запросов {summary["queries"]}, '
+                f'SQL {summary["query_time"]:.1f} мс, '
+                f'шаблоны {summary["render_time"]:.1f} мс, '
+                f'ошибок {summary["errors"]}')
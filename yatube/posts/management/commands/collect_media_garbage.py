@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.media_gc import PHASES, MediaCollector
+
+
+class Command(BaseCommand):
+    help = ('Delete media files and thumbnails no post refers to. '
+            'Resumes from the previous run unless --restart is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Files checked per database round-trip.')
+        parser.add_argument(
+            '--rate', type=int, default=100,
+            help='Maximum files deleted per second.')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Never delete files modified within this many seconds.')
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Stop after examining this many entries.')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--restart', action='store_true')
+
+    def handle(self, *args, **options):
+        collector = MediaCollector(
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            min_age=options['min_age'],
+            limit=options['limit'],
+            dry_run=options['dry_run'],
+        )
+        if options['restart']:
+            collector.reset()
+        finished = collector.run()
+        total = 0
+        for phase in PHASES:
+            stats = collector.stats[phase]
+            total += stats['bytes']
+            self.stdout.write(
+                f'{phase}: удалено {stats["deleted"]}, '
+                f'{filesizeformat(stats["bytes"])}')
+        self.stdout.write(
+            f'Проверено {collector.examined}, '
+            f'освобождено {filesizeformat(total)}.')
+        if not finished:
+            self.stdout.write(
+                'Проход не закончен, следующий запуск продолжит.')
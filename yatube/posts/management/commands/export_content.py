@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporter import FORMATS, export_stream
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = ("Stream an author's or a group's posts and comments as NDJSON "
+            'or CSV, optionally gzipped.')
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--author', help='Username.')
+        source.add_argument('--group', help='Group slug.')
+        parser.add_argument(
+            '--format', choices=tuple(FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--output', default='-', help='File to write; "-" is stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['author']:
+                filters = {'author': User.objects.get(
+                    username=options['author'])}
+            else:
+                filters = {'group': Group.objects.get(slug=options['group'])}
+        except (User.DoesNotExist, Group.DoesNotExist):
+            raise CommandError('Автор или группа не найдены.')
+        chunks = export_stream(options['format'], options['gzip'], **filters)
+        if options['output'] == '-':
+            self.write(sys.stdout.buffer, chunks)
+            return
+        with open(options['output'], 'wb') as output:
+            self.write(output, chunks)
+
+    def write(self, output, chunks):
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
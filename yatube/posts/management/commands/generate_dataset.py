@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.importer import KINDS, Importer
+from posts.models import Post
+from posts.synthetic import Dataset, save_images
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic synthetic dataset: users, groups, '
+            'posts with images, comments and a power-law follow graph.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows-per-user', type=float, default=20,
+            help='Mean number of authors each user follows.')
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Share of posts with an image.')
+        parser.add_argument(
+            '--follow-exponent', type=float, default=1.1,
+            help='Zipf exponent of author popularity among followers.')
+        parser.add_argument(
+            '--author-exponent', type=float, default=1.0,
+            help='Zipf exponent of how prolific authors are.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes generating records; 1 generates inline.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Records generated per task.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per bulk insert.')
+        parser.add_argument(
+            '--transaction-size', type=int, default=50000,
+            help='Records per transaction.')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Skip counters, timelines and the search index.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        images = (save_images(options['seed'])
+                  if options['image_ratio'] > 0 else ())
+        last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        dataset = Dataset(
+            seed=options['seed'],
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows_per_user=options['follows_per_user'],
+            image_ratio=options['image_ratio'],
+            author_exponent=options['author_exponent'],
+            follow_exponent=options['follow_exponent'],
+            images=images,
+            first_post_id=last_post + 1,
+        )
+        importer = Importer(
+            batch_size=options['batch_size'],
+            transaction_size=options['transaction_size'],
+        )
+        importer.run(dataset.records(
+            workers=options['workers'], chunk_size=options['chunk_size']))
+        for kind in KINDS:
+            self.stdout.write(
+                f'{kind}: сгенерировано {importer.read[kind]}, '
+                f'пропущено {importer.skipped[kind]}')
+        if not options['no_rebuild']:
+            importer.rebuild()
+            self.stdout.write('Счётчики, ленты и поиск перестроены.')
+        self.stdout.write(
+            f'Готово за {time.monotonic() - started:.1f} с. Миниатюры '
+            'создаст generate_thumbnails.')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Render variants and metadata for posts uploaded before them.'
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(image='').filter(
+            Q(image_variants='') | Q(image_width__isnull=True)
+        ).values_list('pk', flat=True)
+        done = failed = 0
+        for post_id in pending.iterator():
+            if generate_thumbnails(post_id):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(f'Готово: {done}, с ошибками: {failed}.')
@@ -0,0 +1,63 @@
+import gzip
+import io
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.importer import KINDS, Importer, read_records
+
+
+class Command(BaseCommand):
+    help = ('Bulk import users, groups, posts, comments and follows from '
+            'JSON Lines or CSV files with a "type" field, then rebuild '
+            'counters, timelines and the search index.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help='Files to import in order; "-" reads standard input.')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default=None,
+            help='Defaults to the file extension, JSON Lines otherwise.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per bulk insert.')
+        parser.add_argument(
+            '--transaction-size', type=int, default=20000,
+            help='Records per transaction.')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Leave derived data alone, e.g. between parts of an '
+                 'import; run it with the last part.')
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options['batch_size'],
+            transaction_size=options['transaction_size'],
+        )
+        for path in options['paths']:
+            name = path[:-3] if path.endswith('.gz') else path
+            file_format = options['format'] or (
+                'csv' if name.endswith('.csv') else 'jsonl')
+            with self.open(path) as stream:
+                importer.run(
+                    read_records(stream, file_format, importer.skip))
+        for kind in KINDS:
+            self.stdout.write(
+                f'{kind}: прочитано {importer.read[kind]}, '
+                f'пропущено {importer.skipped[kind]}')
+        unknown = sum(importer.skipped.values()) - sum(
+            importer.skipped[kind] for kind in KINDS)
+        if unknown:
+            self.stdout.write(
+                f'Записей неизвестного типа или с ошибками: {unknown}')
+        if not options['no_rebuild']:
+            importer.rebuild()
+            self.stdout.write('Счётчики, ленты и поиск перестроены.')
+
+    def open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8', newline='')
+        return open(path, encoding='utf-8', newline='')
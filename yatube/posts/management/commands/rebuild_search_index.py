@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text index of posts and comments.'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError(
+                'Полнотекстовый поиск доступен только в SQLite.')
+        search.rebuild_index()
+        self.stdout.write('Поисковый индекс перестроен.')
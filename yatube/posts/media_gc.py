@@ -0,0 +1,287 @@
+"""Incremental removal of media files that no post refers to.
+
+The collector works in three phases: uploaded images under
+``media/posts``, then thumbnail records of images that are gone or whose
+variants changed, then thumbnail files under ``media/cache`` that have no
+record left and that no post lists among its variants. Every phase
+advances in bounded batches and saves its cursor after each one, so an
+interrupted or ``limit``-ed run resumes where it stopped.
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+
+from .models import Blob, Post
+
+PHASES = ('posts', 'index', 'cache')
+
+
+def walk(root, after=None):
+    """Files under ``root`` as media names, in sorted order after ``after``.
+
+    Directories sort as if their name ended with ``/``, which keeps the
+    produced names strictly increasing; subtrees entirely before the
+    cursor are skipped without being listed.
+    """
+    try:
+        entries = sorted(
+            os.scandir(root),
+            key=lambda entry: entry.name + ('/' if entry.is_dir() else ''))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        name = os.path.relpath(
+            entry.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        if entry.is_dir():
+            if after is None or f'{name}/' >= after[:len(name) + 1]:
+                yield from walk(entry.path, after)
+        elif after is None or name > after:
+            yield name, entry.stat()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class MediaCollector:
+    def __init__(self, batch_size=500, rate=100, min_age=3600,
+                 limit=None, dry_run=False, state_path=None):
+        self.batch_size = batch_size
+        self.rate = max(1, rate)
+        self.min_age = min_age
+        self.limit = limit
+        self.dry_run = dry_run
+        self.state_path = state_path or settings.MEDIA_GC_STATE_PATH
+        self.storage = Post._meta.get_field('image').storage
+        self.examined = 0
+        self._variants = None
+        self.stats = {phase: {'deleted': 0, 'bytes': 0} for phase in PHASES}
+
+    # State.
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {'phase': PHASES[0], 'cursor': None}
+
+    def save_state(self, state):
+        if self.dry_run:
+            return
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, self.state_path)
+
+    def reset(self):
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    # Driver.
+
+    def run(self):
+        """Advance the collection; ``True`` once a full pass has finished."""
+        state = self.load_state()
+        while self.limit is None or self.examined < self.limit:
+            phase = state['phase']
+            batch, cursor = getattr(self, f'_next_{phase}')(state['cursor'])
+            if batch:
+                getattr(self, f'_collect_{phase}')(batch)
+                self.examined += len(batch)
+                state = {'phase': phase, 'cursor': cursor}
+            else:
+                next_phase = PHASES.index(phase) + 1
+                if next_phase == len(PHASES):
+                    self.reset()
+                    return True
+                state = {'phase': PHASES[next_phase], 'cursor': None}
+            self.save_state(state)
+        return False
+
+    def _batch_size(self):
+        if self.limit is None:
+            return self.batch_size
+        return max(1, min(self.batch_size, self.limit - self.examined))
+
+    def _next_files(self, directory, cursor):
+        files = walk(os.path.join(settings.MEDIA_ROOT, directory), cursor)
+        for batch in _batched(files, self._batch_size()):
+            return batch, batch[-1][0]
+        return [], cursor
+
+    def _old_enough(self, stat):
+        return stat.st_mtime < time.time() - self.min_age
+
+    def _delete(self, phase, files, storage, recheck=None):
+        """Remove ``files`` at no more than ``rate`` files per second.
+
+        ``recheck`` narrows each chunk down to the files still orphaned;
+        it runs under the storage lock together with the deletion.
+        """
+        for chunk in _batched(files, self.rate):
+            started = time.monotonic()
+            if self.dry_run:
+                self._count(phase, chunk)
+                continue
+            if recheck is None:
+                self._remove(phase, chunk, storage)
+            else:
+                with storage.lock():
+                    self._remove(phase, recheck(chunk), storage)
+            elapsed = time.monotonic() - started
+            time.sleep(max(0, len(chunk) / self.rate - elapsed))
+
+    def _remove(self, phase, files, storage):
+        for name, _ in files:
+            storage.delete(name)
+        self._count(phase, files)
+
+    def _count(self, phase, files):
+        for _, stat in files:
+            self.stats[phase]['deleted'] += 1
+            self.stats[phase]['bytes'] += stat.st_size
+
+    # Phase: uploaded images.
+
+    def _next_posts(self, cursor):
+        return self._next_files('posts', cursor)
+
+    def _unreferenced(self, files):
+        """Files old enough that no post or ``Blob`` refers to."""
+        names = [name for name, _ in files]
+        referenced = set(Post.objects.filter(
+            image__in=names).values_list('image', flat=True))
+        referenced.update(Blob.objects.filter(
+            name__in=names, refcount__gt=0).values_list('name', flat=True))
+        return [
+            (name, stat) for name, stat in files
+            if name not in referenced and self._old_enough(stat)
+        ]
+
+    def _recheck_posts(self, files):
+        """Orphans that are still orphans; their records go with them.
+
+        An upload of the same content may have reused a file since the
+        batch was read: it touches the file and acquires its ``Blob``.
+        """
+        current = []
+        for name, _ in files:
+            try:
+                current.append((name, os.stat(self.storage.path(name))))
+            except FileNotFoundError:
+                pass
+        orphans = self._unreferenced(current)
+        Blob.objects.filter(name__in=[name for name, _ in orphans]).delete()
+        return orphans
+
+    def _collect_posts(self, batch):
+        self._delete('posts', self._unreferenced(batch), self.storage,
+                     self._recheck_posts)
+
+    # Phase: thumbnail records.
+
+    def _next_index(self, cursor):
+        prefix = add_prefix('', 'thumbnails')
+        keys = default.kvstore._find_keys_raw(
+            prefix, after=cursor, limit=self._batch_size())
+        return keys, keys[-1] if keys else cursor
+
+    def _collect_index(self, batch):
+        """Drop records of thumbnails nobody can render any more.
+
+        A source no post uses loses all of them; a source used only by
+        posts with stored variants keeps just the files named there.
+        """
+        kvstore = default.kvstore
+        sources = {
+            del_prefix(key): kvstore._get(del_prefix(key)) for key in batch
+        }
+        usage = {}
+        for image, variants in Post.objects.filter(image__in=[
+            source.name for source in sources.values() if source is not None
+        ]).values_list('image', 'image_variants'):
+            usage.setdefault(image, []).append(variants)
+        for key, source in sources.items():
+            self._prune_source(key, source, usage)
+
+    def _prune_source(self, key, source, usage):
+        kvstore = default.kvstore
+        thumbnail_keys = kvstore._get(key, identity='thumbnails') or []
+        variants = usage.get(source.name) if source is not None else None
+        if variants and all(variants):
+            keep = {
+                variant['name']
+                for stored in variants
+                for rendered in json.loads(stored).values()
+                for variant in rendered
+            }
+        elif variants:
+            return
+        else:
+            keep = set()
+        kept = []
+        for thumbnail_key in thumbnail_keys:
+            thumbnail = kvstore._get(thumbnail_key)
+            if thumbnail is not None and thumbnail.name in keep:
+                kept.append(thumbnail_key)
+            elif not self.dry_run:
+                kvstore._delete(thumbnail_key)
+        if self.dry_run or len(kept) == len(thumbnail_keys):
+            return
+        if kept:
+            kvstore._set(key, kept, identity='thumbnails')
+        else:
+            kvstore._delete(key, identity='thumbnails')
+            kvstore._delete(key)
+
+    # Phase: thumbnail files.
+
+    def _next_cache(self, cursor):
+        return self._next_files(
+            thumbnail_settings.THUMBNAIL_PREFIX.strip('/'), cursor)
+
+    def _live_variants(self):
+        """Variant files named by posts, which render without sorl.
+
+        Posts sharing a file share its variants, so this is read once
+        per run over the distinct variant lists.
+        """
+        if self._variants is None:
+            self._variants = {
+                variant['name']
+                for stored in Post.objects.exclude(image='').exclude(
+                    image_variants='').order_by().values_list(
+                    'image_variants', flat=True).distinct().iterator()
+                for rendered in json.loads(stored).values()
+                for variant in rendered
+            }
+        return self._variants
+
+    def _collect_cache(self, batch):
+        keys = {
+            name: add_prefix(ImageFile(name, default.storage).key)
+            for name, _ in batch
+        }
+        indexed = default.kvstore._get_many_raw(list(keys.values()))
+        live = self._live_variants()
+        orphans = [
+            (name, stat) for name, stat in batch
+            if keys[name] not in indexed and name not in live
+            and self._old_enough(stat)
+        ]
+        self._delete('cache', orphans, default.storage)
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TABLES = ('posts_post', 'posts_comment')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5('
+            f"text, content='{table}', content_rowid='id', "
+            'tokenize="unicode61 remove_diacritics 2")'
+        )
+        schema_editor.execute(
+            f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
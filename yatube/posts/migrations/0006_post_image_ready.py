@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Thumbnails of older uploads are still rendered lazily by sorl.
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').update(image_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
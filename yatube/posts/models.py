@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -8,6 +10,11 @@ class Group(models.Model):
     title = models.CharField('Название группы', max_length=200)
     slug = models.SlugField('Адрес группы', unique=True)
     description = models.TextField('Описание группы', max_length=200)
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -21,13 +28,14 @@ class Post(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True,
-        db_index=True,
     )
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор',
+        db_index=False,
     )
     group = models.ForeignKey(
         Group,
@@ -37,15 +45,55 @@ class Post(models.Model):
         related_name='posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост.',
+        db_index=False,
     )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+    )
+    image_ready = models.BooleanField(
+        'Миниатюры готовы',
+        default=False,
+        editable=False,
+    )
+    image_variants = models.TextField(
+        'Варианты картинки',
         blank=True,
+        editable=False,
+        help_text='JSON с именами и размерами уменьшенных копий.',
+    )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        'Размер файла', null=True, editable=False)
+    image_color = models.CharField(
+        'Основной цвет', max_length=7, blank=True, editable=False)
+    image_blurhash = models.CharField(
+        'BlurHash', max_length=64, blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
     )
 
     class Meta:
         ordering = ('-pub_date',)
+        # One index per feed, in the feed's (pub_date, id) keyset order.
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -58,6 +106,7 @@ class Comment(models.Model):
         Post,
         related_name='comments',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -75,6 +124,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (models.Index(
+            fields=('post', '-created'),
+            name='comment_post_created_idx'),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -88,6 +141,7 @@ class Follow(models.Model):
         verbose_name='Подписчик',
         on_delete=models.CASCADE,
         related_name='follower',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -98,9 +152,76 @@ class Follow(models.Model):
 
     class Meta:
         constraints = (models.UniqueConstraint(
-            fields=('author', 'user'),
+            fields=('user', 'author'),
             name='unique_follower'),
         )
 
     def __str__(self) -> str:
         return f'{self.user} подписался на {self.author}'
+
+
+class UserCounters(models.Model):
+    """Denormalized per-user counters kept current by signals."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return f'Счётчики {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """Materialized follow feed: one row per post per follower."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'post'),
+            name='unique_timeline_entry'),
+        )
+        indexes = (models.Index(
+            fields=('user', '-pub_date', '-post'),
+            name='timeline_user_pub_date_idx'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self) -> str:
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class Blob(models.Model):
+    """A stored media file and the number of posts referring to it."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    refcount = models.PositiveIntegerField('Ссылок', default=0)
+    created = models.DateTimeField('Дата загрузки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,162 @@
+"""Keyset pagination over ``(pub_date, id)`` with opaque cursors."""
+import base64
+import json
+import math
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# SQLite integers are signed 64-bit; larger ones cannot be bound.
+MAX_INTEGER = 2 ** 63 - 1
+# Old ``?page=N`` links past this are treated as out of range.
+MAX_PAGE_NUMBER = 100000
+
+
+def encode_cursor(values, direction):
+    raw = json.dumps(
+        [direction, values],
+        default=lambda value: value.isoformat(),
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def is_cursor_value(value):
+    """Whether ``value`` is an integer, a rank or a date a cursor holds."""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -MAX_INTEGER <= value <= MAX_INTEGER
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, str):
+        try:
+            return parse_datetime(value) is not None
+        except ValueError:
+            return False
+    return False
+
+
+def decode_cursor(cursor):
+    """Return ``(direction, values)`` or ``None`` for a malformed cursor.
+
+    Cursors come from the query string, so every value is checked before
+    it can reach the database.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    if not all(is_cursor_value(value) for value in values):
+        return None
+    return direction, values
+
+
+def seek(ordering, values, forward=True):
+    """Rows strictly after ``values`` in (reversed if not forward) order."""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-') == forward
+        lookup = f'{name}__{"lt" if descending else "gt"}'
+        exact = {
+            previous.lstrip('-'): value
+            for previous, value in zip(ordering[:i], values)
+        }
+        condition |= Q(**exact, **{lookup: values[i]})
+    return condition
+
+
+def cursor_page(rows, next_cursor=None, previous_cursor=None,
+                has_previous=None, number=1, paginator=None):
+    """Plain ``Page`` whose neighbours are known without a count."""
+    page = Page(rows, number, paginator)
+    page.next_cursor = next_cursor
+    page.previous_cursor = previous_cursor
+    if has_previous is None:
+        has_previous = previous_cursor is not None
+    page.has_next = lambda: next_cursor is not None
+    page.has_previous = lambda: has_previous
+    return page
+
+
+class CursorPaginator(Paginator):
+    """Paginator that seeks on the ordering key instead of using OFFSET.
+
+    Pages never need ``COUNT(*)``, so page N costs the same as page 1.
+    Plain ``?page=N`` links are still understood for old bookmarks.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-pk')):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+
+    def _key(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _seek(self, values, forward):
+        return seek(self.ordering, values, forward)
+
+    def _reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        return cursor_page(
+            rows,
+            next_cursor=(encode_cursor(self._key(rows[-1]), NEXT)
+                         if rows and has_next else None),
+            previous_cursor=(encode_cursor(self._key(rows[0]), PREVIOUS)
+                             if rows and has_previous else None),
+            number=number,
+            paginator=self,
+        )
+
+    def _seek_page(self, queryset, direction, values):
+        if direction == NEXT:
+            rows = list(queryset.filter(
+                self._seek(values, True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            return self._build_page(rows[:self.per_page], 1, has_more, True)
+        rows = list(queryset.order_by(*self._reversed_ordering()).filter(
+            self._seek(values, False))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page][::-1], 1, True, has_more)
+
+    def get_cursor_page(self, cursor=None, page_number=None):
+        queryset = self.object_list.order_by(*self.ordering)
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is not None and len(decoded[1]) == len(self.ordering):
+            try:
+                return self._seek_page(queryset, *decoded)
+            except (ValidationError, TypeError, ValueError):
+                pass
+        try:
+            number = min(max(int(page_number), 1), MAX_PAGE_NUMBER)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            return self.get_cursor_page()
+        return self.page_from_rows(rows, number)
+
+    def first_rows(self):
+        """Rows ``page_from_rows`` needs for the first page."""
+        return list(self.object_list.order_by(
+            *self.ordering)[:self.per_page + 1])
+
+    def page_from_rows(self, rows, number=1):
+        """Page ``number`` from its rows plus one more if there is one."""
+        has_more = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page], number,
+                                has_more, number > 1)
@@ -0,0 +1,194 @@
+"""Full-text search over posts and comments backed by SQLite FTS5.
+
+Each searchable model gets an external-content FTS5 table, so the text
+is stored only once. The index is kept in sync by the signals in
+``posts.signals``: Django rebuilds SQLite tables on many schema changes,
+which would silently drop triggers. ``rebuild_index`` re-reads the
+content tables in one pass after bulk loads.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from .models import Comment, Post
+from .paginator import NEXT, decode_cursor, encode_cursor
+
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_TOKENS = 12
+MAX_TERMS = 8
+MAX_YO_VARIANTS = 3
+
+# Inflection endings stripped from query words, longest first. Prefix
+# matching on the stem then finds the other forms of the word.
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'иях', 'ией', 'ием', 'ого', 'его', 'ому', 'ему',
+    'ыми', 'ими', 'ость', 'ости', 'ться', 'тся', 'ешь', 'ете', 'ишь',
+    'ите', 'ала', 'ила', 'ыла', 'ела', 'али', 'или', 'ыли', 'ели', 'ая',
+    'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем', 'ам',
+    'ям', 'ах', 'ях', 'ию', 'ия', 'ью', 'ья', 'ов', 'ев', 'ть', 'а', 'я',
+    'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+# Admin changelists show at most this many best matches.
+ADMIN_RESULTS_LIMIT = 1000
+
+
+class SearchIndex:
+    """FTS5 index over the ``text`` column of one model."""
+
+    def __init__(self, model):
+        self.model = model
+        self.content = model._meta.db_table
+        self.table = f'{self.content}_fts'
+
+    def add(self, pk, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [pk, text])
+
+    def remove(self, pk, text):
+        """Remove a row; ``text`` must be the text that was indexed."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} ({self.table}, rowid, text) '
+                "VALUES ('delete', %s, %s)",
+                [pk, text])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} ({self.table}) VALUES ('rebuild')")
+
+
+post_index = SearchIndex(Post)
+comment_index = SearchIndex(Comment)
+INDEXES = (post_index, comment_index)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def rebuild_index():
+    for index in INDEXES:
+        index.rebuild()
+
+
+def stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def yo_variants(word):
+    """The word plus spellings with a single 'е' written as 'ё'.
+
+    unicode61 does not fold 'ё' into 'е', and Russian texts use both.
+    """
+    variants = [word]
+    for position, letter in enumerate(word):
+        if letter == 'е' and len(variants) <= MAX_YO_VARIANTS:
+            variants.append(f'{word[:position]}ё{word[position + 1:]}')
+    return variants
+
+
+def build_match(query):
+    """Safe FTS5 MATCH expression for free text typed by a user."""
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))[:MAX_TERMS]
+    terms = []
+    for word in words:
+        alternatives = ' OR '.join(
+            f'"{variant}"*' for variant in yo_variants(stem(word)))
+        terms.append(f'({alternatives})')
+    return ' AND '.join(terms)
+
+
+def highlight(snippet):
+    return escape(snippet).replace(
+        SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def _is_search_key(values):
+    """Whether cursor ``values`` are a ``(rank, pk)`` pair."""
+    return (len(values) == 2 and isinstance(values[0], (int, float))
+            and isinstance(values[1], int))
+
+
+def _search(index, query, filters, cursor, limit):
+    match = build_match(query)
+    if not match:
+        return [], None
+    where = [f'{index.table} MATCH %s']
+    params = [match]
+    for column, value in filters.items():
+        if value is not None:
+            where.append(f'c.{column} = %s')
+            params.append(value)
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded is not None and _is_search_key(decoded[1]):
+        rank, pk = decoded[1]
+        where.append(
+            f'(bm25({index.table}) > %s '
+            f'OR (bm25({index.table}) = %s AND c.id > %s))')
+        params.extend([rank, rank, pk])
+    sql = (
+        f'SELECT c.id, bm25({index.table}), '
+        f"snippet({index.table}, 0, '{SNIPPET_START}', '{SNIPPET_END}', "
+        f"'…', {SNIPPET_TOKENS}) "
+        f'FROM {index.table} JOIN {index.content} c '
+        f'ON c.id = {index.table}.rowid '
+        f'WHERE {" AND ".join(where)} '
+        f'ORDER BY bm25({index.table}), c.id LIMIT %s'
+    )
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][1], rows[-1][0]], NEXT)
+    return rows, next_cursor
+
+
+def search_posts(query, group=None, author=None, cursor=None, limit=10):
+    """Ranked posts matching ``query`` with highlighted snippets.
+
+    Returns the posts (each with a ``snippet`` attribute) and the cursor
+    of the next page or ``None``.
+    """
+    rows, next_cursor = _search(
+        post_index, query,
+        {'group_id': group, 'author_id': author}, cursor, limit)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [row[0] for row in rows])
+    results = []
+    for pk, _, snippet in rows:
+        if pk in posts:
+            posts[pk].snippet = highlight(snippet)
+            results.append(posts[pk])
+    return results, next_cursor
+
+
+def search_comments(query, author=None, cursor=None, limit=10):
+    rows, next_cursor = _search(
+        comment_index, query, {'author_id': author}, cursor, limit)
+    comments = Comment.objects.select_related('author', 'post').in_bulk(
+        [row[0] for row in rows])
+    results = []
+    for pk, _, snippet in rows:
+        if pk in comments:
+            comments[pk].snippet = highlight(snippet)
+            results.append(comments[pk])
+    return results, next_cursor
+
+
+def matching_ids(model, query, limit=ADMIN_RESULTS_LIMIT):
+    """Primary keys of the best matches, for admin changelists."""
+    index = post_index if model is Post else comment_index
+    rows, _ = _search(index, query, {}, None, limit)
+    return [row[0] for row in rows]
@@ -0,0 +1,181 @@
+"""Signal handlers keeping derived data in sync with posts and follows."""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from core.tasks import run_async
+
+from . import blobs, counters, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        run_async(timeline.fan_out_post, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        run_async(timeline.backfill, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_state(sender, instance, raw=False, **kwargs):
+    instance._saved_group_id = instance._saved_text = None
+    saved_image = ''
+    if instance.pk is not None and not raw:
+        instance._saved_group_id, instance._saved_text, saved_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'text', 'image').first() or (None, None, ''))
+    instance._saved_image = saved_image or ''
+    instance._image_changed = (
+        not raw and (instance.image.name or '') != instance._saved_image)
+    # The storage counts the reference of a file it is about to save.
+    instance._image_uploaded = bool(
+        instance.image) and not instance.image._committed
+    if instance._image_changed:
+        instance.image_ready = False
+        instance.image_variants = ''
+        instance.image_width = instance.image_height = None
+        instance.image_size = None
+        instance.image_color = instance.image_blurhash = ''
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and instance._image_changed and instance.image:
+        run_async(thumbnails.generate_thumbnails, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, raw=False, **kwargs):
+    if raw or not instance._image_changed:
+        return
+    if instance.image and not instance._image_uploaded:
+        blobs.acquire(instance.image.name)
+    if instance._saved_image:
+        blobs.release(instance._saved_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        blobs.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_user(instance.author_id, posts_count=1)
+        counters.change_group(instance.group_id, 1)
+    elif instance._saved_group_id != instance.group_id:
+        counters.change_group(instance._saved_group_id, -1)
+        counters.change_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    counters.change_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, followers_count=1)
+        counters.change_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_index(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version('index_page')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_post_cards(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version('post_cards')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follows(sender, **kwargs):
+    bump_version('follows')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    bump_version(f'comments:{instance.post_id}')
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_text(sender, instance, raw=False, **kwargs):
+    instance._saved_text = None
+    if instance.pk is not None and not raw:
+        instance._saved_text = Comment.objects.filter(
+            pk=instance.pk).values_list('text', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_text(sender, instance, raw=False, **kwargs):
+    if raw or not search.is_available():
+        return
+    index = search.post_index if sender is Post else search.comment_index
+    if instance._saved_text == instance.text:
+        return
+    if instance._saved_text is not None:
+        index.remove(instance.pk, instance._saved_text)
+    index.add(instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def unindex_text(sender, instance, **kwargs):
+    if search.is_available():
+        index = search.post_index if sender is Post else search.comment_index
+        index.remove(instance.pk, instance.text)
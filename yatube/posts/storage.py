@@ -0,0 +1,88 @@
+"""Content-addressed file storage for post images."""
+import hashlib
+import os
+import posixpath
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+DEFAULT_FILE_MODE = 0o644
+LOCK_NAME = '.blobs.lock'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each distinct file once, named after its SHA-256 digest.
+
+    The upload is hashed while it is streamed to a temporary file, so it
+    is read only once. A file whose digest is already stored is dropped
+    and the existing name is returned; the upload name keeps only its
+    directory and extension: ``posts/ab/<digest>.jpg``.
+
+    The saved file is counted as referenced before its name is returned,
+    under the lock ``blobs.delete_file`` takes, so a file whose last post
+    is being deleted cannot disappear under a new upload of it.
+    """
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock shared by all processes using this storage."""
+        os.makedirs(self.location, exist_ok=True)
+        fd = os.open(self.path(LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], f'{hexdigest}{extension}')
+            with self.lock():
+                self._store(temp_path, name)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def _store(self, temp_path, name):
+        # Imported here: the models module imports this one.
+        from . import blobs
+
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.remove(temp_path)
+            # A fresh mtime keeps the media collector off the file
+            # until the new post referring to it is committed.
+            os.utime(full_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.chmod(temp_path, self.file_permissions_mode
+                     or DEFAULT_FILE_MODE)
+            os.replace(temp_path, full_path)
+        blobs.acquire(name)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, see _save().
+        return name
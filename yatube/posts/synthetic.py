@@ -0,0 +1,208 @@
+"""Deterministic synthetic datasets for benchmarks and load tests.
+
+Records are produced in independent chunks, each seeded from the run's
+seed and its own position, so the output depends only on the seed and
+the sizes, never on how many processes generated it. Chunks are fed to
+``Importer``, which writes them with bulk inserts.
+
+Popularity follows a Zipf law: a few accounts write many of the posts
+and gather most of the followers, while most accounts stay small.
+"""
+import bisect
+import io
+import itertools
+import random
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from multiprocessing import Pool
+
+from faker import Faker
+from PIL import Image
+
+from django.core.files.base import ContentFile
+
+from .models import Post
+
+START_DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+POST_INTERVAL = timedelta(seconds=10)
+IMAGE_COUNT = 16
+IMAGE_SIZE = (960, 640)
+LOCALE = 'ru_RU'
+# Chunks per worker generated ahead of the consumer.
+IN_FLIGHT = 2
+
+
+@lru_cache(maxsize=4)
+def zipf_weights(count, exponent):
+    """Cumulative weights of ranks ``1..count`` under a Zipf law."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def pick(rng, cumulative):
+    """Index drawn with the probabilities of ``cumulative`` weights."""
+    return bisect.bisect(cumulative, rng.random() * cumulative[-1])
+
+
+@lru_cache(maxsize=1)
+def get_faker():
+    """One ``Faker`` per process; building it takes a while."""
+    return Faker(LOCALE)
+
+
+def username(index):
+    return f'user{index:07d}'
+
+
+def pub_date(index):
+    return START_DATE + POST_INTERVAL * index
+
+
+class Dataset:
+    def __init__(self, seed=0, users=1000, groups=20, posts=10000,
+                 comments=20000, follows_per_user=20, image_ratio=0.1,
+                 author_exponent=1.0, follow_exponent=1.1, images=(),
+                 first_post_id=1):
+        self.seed = seed
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows_per_user = follows_per_user
+        self.image_ratio = image_ratio if images else 0
+        self.author_exponent = author_exponent
+        self.follow_exponent = follow_exponent
+        self.images = list(images)
+        self.first_post_id = first_post_id
+
+    def chunks(self, chunk_size):
+        """``(kind, start, stop)`` work units in import order."""
+        for kind, total in (('user', self.users), ('group', self.groups),
+                            ('post', self.posts),
+                            ('comment', self.comments),
+                            ('follow', self.users)):
+            for start in range(0, total, chunk_size):
+                yield kind, start, min(start + chunk_size, total)
+
+    def generate(self, chunk):
+        """Records of one work unit; the same for the same seed."""
+        kind, start, stop = chunk
+        rng = random.Random(f'{self.seed}:{kind}:{start}')
+        fake = get_faker()
+        fake.seed_instance(f'{self.seed}:{kind}:{start}')
+        build = getattr(self, f'_{kind}')
+        records = []
+        for index in range(start, stop):
+            record = build(index, rng, fake)
+            if isinstance(record, list):
+                records.extend(record)
+            else:
+                records.append(record)
+        return records
+
+    def records(self, workers=1, chunk_size=10000):
+        """All records in order, generated by ``workers`` processes.
+
+        At most ``IN_FLIGHT`` chunks per worker are queued or waiting to
+        be consumed, so memory stays bounded when the importer is slower
+        than the generators.
+        """
+        chunks = self.chunks(chunk_size)
+        if workers <= 1:
+            for chunk in chunks:
+                yield from self.generate(chunk)
+            return
+        with Pool(workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                if len(pending) >= IN_FLIGHT * workers:
+                    yield from pending.popleft().get()
+                pending.append(pool.apply_async(self.generate, (chunk,)))
+            while pending:
+                yield from pending.popleft().get()
+
+    def _user(self, index, rng, fake):
+        return {
+            'type': 'user',
+            'username': username(index),
+            'first_name': fake.first_name(),
+            'last_name': fake.last_name(),
+            'email': f'{username(index)}@example.com',
+            'date_joined': START_DATE.isoformat(),
+        }
+
+    def _group(self, index, rng, fake):
+        return {
+            'type': 'group',
+            'slug': f'group-{index}',
+            'title': fake.catch_phrase()[:200],
+            'description': fake.sentence()[:200],
+        }
+
+    def _post(self, index, rng, fake):
+        authors = zipf_weights(self.users, self.author_exponent)
+        record = {
+            'type': 'post',
+            'id': self.first_post_id + index,
+            'author': username(pick(rng, authors)),
+            'text': fake.paragraph(nb_sentences=rng.randint(1, 6)),
+            'pub_date': pub_date(index).isoformat(),
+        }
+        if self.groups and rng.random() < 0.5:
+            record['group'] = f'group-{rng.randrange(self.groups)}'
+        if rng.random() < self.image_ratio:
+            record['image'] = rng.choice(self.images)
+        return record
+
+    def _comment(self, index, rng, fake):
+        post = rng.randrange(self.posts)
+        created = pub_date(post) + timedelta(
+            seconds=rng.randrange(2 * 24 * 3600))
+        return {
+            'type': 'comment',
+            'post': self.first_post_id + post,
+            'author': username(rng.randrange(self.users)),
+            'text': fake.sentence(),
+            'created': created.isoformat(),
+        }
+
+    def _follow(self, index, rng, fake):
+        """Follows of one user, to authors drawn by popularity."""
+        targets = zipf_weights(self.users, self.follow_exponent)
+        count = min(self.users - 1, int(rng.expovariate(
+            1 / self.follows_per_user))) if self.follows_per_user else 0
+        authors = set()
+        while len(authors) < count:
+            author = pick(rng, targets)
+            if author != index:
+                authors.add(author)
+        return [
+            {'type': 'follow', 'user': username(index),
+             'author': username(author)}
+            for author in sorted(authors)
+        ]
+
+
+def save_images(seed, count=IMAGE_COUNT):
+    """Store ``count`` distinct gradient JPEGs and return their names.
+
+    Posts share these few files, which keeps generation fast while the
+    storage and thumbnails see realistic images.
+    """
+    rng = random.Random(f'{seed}:image')
+    storage = Post._meta.get_field('image').storage
+    names = []
+    for number in range(count):
+        start, end = ([rng.randrange(256) for _ in range(3)]
+                      for _ in range(2))
+        gradient = Image.linear_gradient('L').resize(IMAGE_SIZE)
+        image = Image.merge('RGB', [
+            gradient.point(lambda value, a=a, b=b: a + (b - a) * value // 255)
+            for a, b in zip(start, end)
+        ])
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=80)
+        names.append(storage.save(
+            f'posts/synthetic-{number}.jpg', ContentFile(output.getvalue())))
+    return names
@@ -0,0 +1,44 @@
+"""Feed cards assembled from per-post cached HTML fragments."""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from core.cache import get_version
+
+from ..thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post, variant, version):
+    return (f'post_card:{variant}:{get_language()}:{version}:'
+            f'{post.pk}:{post.updated.timestamp()}')
+
+
+@register.simple_tag
+def post_cards(posts, variant):
+    """Rendered cards for ``posts``, fetched with one ``get_many``.
+
+    Cards are keyed by post id and ``updated``; author and group changes
+    bump the ``post_cards`` version.
+    """
+    posts = list(posts)
+    version = get_version('post_cards')
+    keys = [card_key(post, variant, version) for post in posts]
+    cached = cache.get_many(keys)
+    stale = [(key, post) for key, post in zip(keys, posts)
+             if key not in cached]
+    prefetch_thumbnails(post for _, post in stale)
+    missing = {}
+    for key, post in stale:
+        missing[key] = render_to_string(
+            CARD_TEMPLATE, {'post': post, 'variant': variant})
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cached.update(missing)
+    return [mark_safe(cached[key]) for key in keys]
@@ -0,0 +1,67 @@
+"""Responsive ``<picture>`` markup built from stored image variants."""
+import json
+
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+from sorl.thumbnail import default
+
+from ..thumbnails import MIME_TYPES
+
+register = template.Library()
+
+FEED_SIZES = '(min-width: 768px) 75vw, 100vw'
+
+
+def srcset(variants):
+    return ', '.join(
+        f'{default.storage.url(variant["name"])} {variant["width"]}w'
+        for variant in variants
+    )
+
+
+@register.simple_tag
+def post_picture(post, sizes=FEED_SIZES, css_class='card-img my-2'):
+    """``<picture>`` for a post with ready variants, else an empty string.
+
+    Only ``Post.image_variants`` is read; URLs are built by the storage
+    without checking that the files exist.
+    """
+    if not post.image_variants:
+        return ''
+    variants = json.loads(post.image_variants)
+    fallback = variants.get('JPEG')
+    if not fallback:
+        return ''
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[image_format], srcset(rendered), sizes)
+         for image_format, rendered in variants.items()
+         if image_format != 'JPEG'),
+    )
+    card_width = settings.POST_IMAGE_ASPECT[0]
+    default_image = next(
+        (variant for variant in fallback if variant['width'] >= card_width),
+        fallback[-1],
+    )
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" loading="lazy" alt=""{}></picture>',
+        sources,
+        css_class,
+        default.storage.url(default_image['name']),
+        srcset(fallback),
+        sizes,
+        default_image['width'],
+        default_image['height'],
+        placeholder_attrs(post),
+    )
+
+
+def placeholder_attrs(post):
+    """Dominant colour background and BlurHash for a post image, if known."""
+    if not post.image_color:
+        return ''
+    return format_html(
+        ' style="background-color: {};" data-blurhash="{}"',
+        post.image_color, post.image_blurhash)
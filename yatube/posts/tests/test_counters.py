@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User, UserCounters
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test_slug',
+            description='test_description',
+        )
+        cls.other_group = Group.objects.create(
+            title='other_group',
+            slug='other_slug',
+            description='other_description',
+        )
+
+    def refresh(self):
+        self.author.counters.refresh_from_db()
+        self.reader.counters.refresh_from_db()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев меняются с записями."""
+        post = Post.objects.create(
+            author=self.author, text='post', group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='hi')
+        post.refresh_from_db()
+        self.refresh()
+        self.assertEqual(self.author.counters.posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.refresh()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.refresh()
+        self.assertEqual(self.author.counters.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.refresh()
+        self.assertEqual(self.author.counters.followers_count, 1)
+        self.assertEqual(self.reader.counters.following_count, 1)
+        follow.delete()
+        self.refresh()
+        self.assertEqual(self.author.counters.followers_count, 0)
+        self.assertEqual(self.reader.counters.following_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters чинит разошедшиеся счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'bulk {i}', group=self.group)
+            for i in range(3)
+        )
+        UserCounters.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.refresh()
+        self.assertEqual(self.author.counters.posts_count, 3)
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertIn('Group.posts_count: исправлено 1', out.getvalue())
+
+    def test_detail_reads_stored_counter(self):
+        """Страница поста берёт число постов автора из счётчика."""
+        post = Post.objects.create(author=self.author, text='post')
+        UserCounters.objects.filter(user=self.author).update(posts_count=42)
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(response.context['n_posts'], 42)
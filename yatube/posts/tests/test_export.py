@@ -0,0 +1,81 @@
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+@override_settings(EXPORT_BATCH_SIZE=2)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(5):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Ответ {number}')
+        cls.first_pub_date = cls.group.posts.order_by('pk').first().pub_date
+        Post.objects.create(author=cls.reader, text='Чужой пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_author_export_is_ndjson(self):
+        """Автор выгружает свои посты построчным JSON."""
+        response = self.client.get(
+            reverse('posts:profile_export', args=[self.author]))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line)
+                   for line in self.read(response).splitlines()]
+        self.assertEqual([record['text'] for record in records],
+                         [f'Пост {number}' for number in range(4, -1, -1)])
+        self.assertEqual(records[0]['group'], 'group')
+
+    def test_group_export_csv_gzip(self):
+        """Группа выгружается в CSV, сжатом на лету."""
+        response = self.client.get(
+            reverse('posts:group_export', args=[self.group.slug]),
+            {'format': 'csv', 'gzip': '1'})
+        self.assertIn('group.csv.gz', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(
+            gzip.decompress(self.read(response)).decode())))
+        self.assertEqual(sorted(row['type'] for row in rows),
+                         ['comment'] * 5 + ['post'] * 5)
+
+    def test_foreign_profile_forbidden(self):
+        """Чужой профиль выгрузить нельзя."""
+        response = self.client.get(
+            reverse('posts:profile_export', args=[self.reader]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_can_be_imported(self):
+        """Выгрузку можно загрузить обратно командой импорта."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        path = f'{location}/group.ndjson.gz'
+        call_command('export_content', '--group', 'group', '--gzip',
+                     '--output', path)
+        Post.objects.filter(group=self.group).delete()
+        call_command('import_content', path, stdout=io.StringIO())
+        self.assertEqual(self.group.posts.count(), 5)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertEqual(
+            self.group.posts.order_by('pk').first().pub_date,
+            self.first_pub_date)
@@ -83,7 +83,8 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(Post.objects.filter(
             text=form_data['text'],
             group=form_data['group'],
-            image='posts/small.gif').exists()
+            image__startswith='posts/',
+            image__endswith='.gif').exists()
         )
 
     def test_cant_create_existing_slug(self):
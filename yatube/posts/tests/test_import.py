@@ -0,0 +1,92 @@
+import io
+import json
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..importer import Importer, read_records
+from ..models import Comment, Follow, Group, Post, User
+
+RECORDS = [
+    {'type': 'user', 'username': 'leo', 'first_name': 'Лев'},
+    {'type': 'user', 'username': 'fan'},
+    {'type': 'group', 'slug': 'prose', 'title': 'Проза'},
+    {'type': 'post', 'id': 500, 'author': 'leo', 'group': 'prose',
+     'text': 'Война и мир', 'pub_date': '1869-01-01T00:00:00'},
+    {'type': 'post', 'author': 'leo', 'text': 'Анна Каренина'},
+    {'type': 'comment', 'post': 500, 'author': 'fan', 'text': 'Длинно'},
+    {'type': 'comment', 'post': 404, 'author': 'fan', 'text': 'Мимо'},
+    {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+    {'type': 'follow', 'user': 'fan', 'author': 'leo'},
+    {'type': 'poem', 'text': '?'},
+]
+
+
+class ImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_import_and_rebuild(self):
+        """Импорт создаёт записи и пересчитывает производные данные."""
+        importer = Importer(batch_size=2, transaction_size=3)
+        with self.assertLogs('posts.importer', 'WARNING'):
+            importer.run(RECORDS)
+        importer.rebuild()
+        leo = User.objects.get(username='leo')
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.pub_date.year, 1869)
+        self.assertEqual(post.group, Group.objects.get(slug='prose'))
+        self.assertEqual(Post.objects.filter(author=leo).count(), 2)
+        self.assertEqual(post.comments.get().author.username, 'fan')
+        self.assertTrue(Follow.objects.filter(
+            user__username='fan', author=leo).exists())
+        self.assertEqual(leo.counters.posts_count, 2)
+        self.assertEqual(leo.counters.followers_count, 1)
+        self.assertEqual(Post.objects.get(pk=500).comments_count, 1)
+        self.assertEqual(
+            User.objects.get(username='fan').timeline.count(), 2)
+        self.assertEqual(importer.skipped, {'comment': 1, 'post': 1,
+                                            'poem': 1})
+
+    def test_rerun_skips_existing_rows(self):
+        """Повторный импорт не создаёт дублей."""
+        records = [record for record in RECORDS if 'id' in record
+                   or record['type'] in ('user', 'group', 'follow')]
+        Importer().run(records)
+        Importer().run(records)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_command_reads_csv_and_jsonl(self):
+        """Команда читает CSV и JSON Lines."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        with open(f'{location}/users.csv', 'w') as users:
+            users.write('type,username,first_name\nuser,leo,Лев\n')
+        with open(f'{location}/posts.jsonl', 'w') as posts:
+            posts.write(json.dumps(
+                {'type': 'post', 'author': 'leo', 'text': 'Текст'}) + '\n')
+        call_command('import_content', f'{location}/users.csv',
+                     f'{location}/posts.jsonl', stdout=io.StringIO())
+        self.assertEqual(Post.objects.get().author.first_name, 'Лев')
+        self.assertFalse(Comment.objects.exists())
+
+    def test_bad_lines_skipped(self):
+        """Битые строки JSON Lines пропускаются с номером строки."""
+        stream = io.StringIO(
+            '{"type": "user", "username": "leo"}\n'
+            '{"type": "user",\n'
+            '\n'
+            '[1, 2]\n'
+            '{"type": "user", "username": "fan"}\n')
+        importer = Importer()
+        with self.assertLogs('posts.importer', 'WARNING') as logs:
+            importer.run(read_records(stream, 'jsonl', importer.skip))
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(importer.skipped, {'?': 2})
+        self.assertIn('line 2', logs.output[0])
+        self.assertIn('line 4', logs.output[1])
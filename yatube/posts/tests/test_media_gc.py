@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from sorl.thumbnail import default
+
+from ..media_gc import MediaCollector, walk
+from ..models import Blob, Post, User
+from .test_thumbnails import upload_png
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class MediaCollectorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='janitor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+        self.media_root = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        media_settings = self.settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.state_dir, ignore_errors=True)
+        self.post = Post.objects.create(
+            author=self.user, text='Живой', image=upload_png())
+
+    def collector(self, **kwargs):
+        kwargs.setdefault('min_age', 0)
+        kwargs.setdefault('rate', 10000)
+        return MediaCollector(
+            state_path=os.path.join(self.state_dir, 'state.json'), **kwargs)
+
+    def media_file(self, name, content=b'orphan', age=7200):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as media:
+            media.write(content)
+        old = os.path.getmtime(path) - age
+        os.utime(path, (old, old))
+        return path
+
+    def live_files(self):
+        return sorted(name for name, _ in walk(self.media_root))
+
+    def test_orphans_removed_and_reported(self):
+        """Сироты удаляются, используемые файлы остаются."""
+        live = self.live_files()
+        upload_orphan = self.media_file('posts/zz/orphan.gif', b'x' * 10)
+        thumbnail_orphan = self.media_file('cache/zz/zz/orphan.jpg', b'y' * 5)
+        collector = self.collector()
+        self.assertTrue(collector.run())
+        self.assertFalse(os.path.exists(upload_orphan))
+        self.assertFalse(os.path.exists(thumbnail_orphan))
+        self.assertEqual(self.live_files(), live)
+        self.assertEqual(collector.stats['posts'], {'deleted': 1, 'bytes': 10})
+        self.assertEqual(collector.stats['cache'], {'deleted': 1, 'bytes': 5})
+
+    def test_recent_files_kept(self):
+        """Свежие файлы могут принадлежать незавершённой загрузке."""
+        path = self.media_file('posts/zz/fresh.gif', age=0)
+        self.collector(min_age=3600).run()
+        self.assertTrue(os.path.exists(path))
+
+    def test_thumbnails_of_lost_images_removed(self):
+        """Миниатюры картинки без постов удаляются вместе с записями."""
+        thumbnails = [name for name in self.live_files()
+                      if name.startswith('cache/')]
+        self.assertTrue(thumbnails)
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        for name in thumbnails:
+            self.media_file(name, b'old')
+        self.collector().run()
+        self.assertEqual(
+            [name for name in self.live_files() if name.startswith('cache/')],
+            [])
+
+    def test_variants_kept_without_records(self):
+        """Варианты из image_variants живы, даже если записей sorl нет."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertTrue(post.image_variants)
+        variants = [name for name in self.live_files()
+                    if name.startswith('cache/')]
+        for name in variants:
+            self.media_file(name, b'old')
+        default.kvstore.clear()
+        self.collector().run()
+        self.assertEqual(
+            [name for name in self.live_files() if name.startswith('cache/')],
+            variants)
+
+    def test_reupload_during_collection_kept(self):
+        """Файл, загруженный заново во время сборки, не удаляется."""
+        orphan = Post.objects.create(
+            author=self.user, text='Сирота', image=upload_png(size=(20, 10)))
+        name = orphan.image.name
+        Post.objects.filter(pk=orphan.pk).update(image='')
+        Blob.objects.filter(name=name).delete()
+        old = os.path.getmtime(orphan.image.path) - 7200
+        os.utime(orphan.image.path, (old, old))
+        collector = self.collector()
+        unreferenced = collector._unreferenced
+        uploads = []
+
+        def upload_after_first_check(files):
+            # The upload lands between choosing orphans and deleting them.
+            orphans = unreferenced(files)
+            if not uploads:
+                uploads.append(Post.objects.create(
+                    author=self.user, text='Снова',
+                    image=upload_png(size=(20, 10))))
+            return orphans
+
+        collector._unreferenced = upload_after_first_check
+        collector.run()
+        self.assertTrue(os.path.exists(orphan.image.path))
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+
+    def test_run_resumes_after_limit(self):
+        """Ограниченный запуск сохраняет позицию и продолжается."""
+        paths = [self.media_file(f'posts/o{number}/orphan.gif')
+                 for number in range(3)]
+        runs = 1
+        while not self.collector(limit=1).run():
+            runs += 1
+        self.assertGreater(runs, 3)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+    def test_walk_is_ordered_and_resumable(self):
+        """Обход идёт по порядку и продолжается с курсора."""
+        for name in ('posts/a.gif', 'posts/a/b.gif', 'posts/b/c.gif'):
+            self.media_file(name)
+        root = os.path.join(self.media_root, 'posts')
+        names = [name for name, _ in walk(root)]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(
+            [name for name, _ in walk(root, 'posts/a/b.gif')],
+            names[names.index('posts/a/b.gif') + 1:])
+
+    def test_dry_run_deletes_nothing(self):
+        """Пробный запуск только считает."""
+        path = self.media_file('posts/zz/orphan.gif')
+        collector = self.collector(dry_run=True)
+        collector.run()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(collector.stats['posts']['deleted'], 1)
@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..paginator import NEXT, CursorPaginator, encode_cursor
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor_user')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test_slug',
+            description='test_description',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(25)
+        )
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_walk_forward_and_back(self):
+        """Курсоры ведут вперёд и назад без пропусков и повторов."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_cursor_page()
+        second = paginator.get_cursor_page(cursor=first.next_cursor)
+        third = paginator.get_cursor_page(cursor=second.next_cursor)
+        self.assertEqual(
+            list(first) + list(second) + list(third), self.expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        back = paginator.get_cursor_page(cursor=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_no_count_query(self):
+        """Страница не выполняет COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_cursor_page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(paginator.get_cursor_page(cursor=cursor))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            {'cursor': 'not-a-cursor'})
+        self.assertEqual(
+            list(response.context['page_obj']), self.expected[:10])
+
+    def test_out_of_range_input_falls_back_to_first_page(self):
+        """Огромные номер страницы и значения курсора не ломают ленту."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        for params in (
+            {'page': '9' * 20},
+            {'cursor': encode_cursor(
+                ['2020-01-01T00:00:00+00:00', 10 ** 20], NEXT)},
+            {'cursor': encode_cursor(['2020-13-01T00:00:00', 1], NEXT)},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(
+                    list(response.context['page_obj']), self.expected[:10])
+
+    def test_widget_links_use_cursor(self):
+        """Виджет пагинатора ссылается на курсор следующей страницы."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user}))
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..models import Post, User
+from ..templatetags.post_cards import post_cards
+
+
+class PostCardsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='card_author', first_name='Лев', last_name='Толстой')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(author=self.user, text='Война')
+
+    def test_cards_are_cached(self):
+        """Повторная отрисовка берёт карточку из кеша."""
+        first = post_cards([self.post], 'index')
+        Post.objects.filter(pk=self.post.pk).update(text='Мир')
+        self.post.text = 'Мир'
+        self.assertEqual(post_cards([self.post], 'index'), first)
+
+    def test_edit_refreshes_card(self):
+        """Изменение поста даёт новую карточку."""
+        post_cards([self.post], 'index')
+        self.post.text = 'Мир'
+        self.post.save()
+        self.assertIn('Мир', post_cards([self.post], 'index')[0])
+
+    def test_author_change_refreshes_card(self):
+        """Смена имени автора сбрасывает карточки."""
+        post_cards([self.post], 'profile')
+        self.user.first_name = 'Алексей'
+        self.user.save()
+        self.assertIn('Алексей', post_cards([self.post], 'profile')[0])
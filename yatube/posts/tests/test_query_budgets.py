@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.queries import QueryLog, query_shape
+from core.testing import QueryBudgetMixin
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        groups = [
+            Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание')
+            for number in range(3)
+        ]
+        cls.group = groups[0]
+        authors = [
+            User.objects.create_user(username=f'author-{number}')
+            for number in range(4)
+        ]
+        cls.author = authors[0]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for number in range(24):
+            cls.post = Post.objects.create(
+                author=authors[number % len(authors)],
+                group=groups[number % len(groups)] if number % 2 else None,
+                text=f'Пост {number}')
+        cls.post.group = cls.group
+        cls.post.save()
+        for author in authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text=f'От {author}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_feeds_within_budget(self):
+        """Ленты укладываются в бюджет запросов и не делают N+1."""
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                self.assertQueryBudget(url)
+                self.assertQueryBudget(f'{url}?page=2')
+
+    def test_writes_within_budget(self):
+        """Запись поста и комментария укладывается в бюджет."""
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_repeated_shapes_detected(self):
+        """Один запрос с разными параметрами много раз — это N+1."""
+        log = QueryLog()
+        sql = 'SELECT name FROM auth_user WHERE id = %s'
+        log.queries = [(sql, 0)] * 5 + [
+            ('SELECT 1 WHERE id IN (%s, %s)', 0),
+            ('SELECT 1 WHERE id IN (%s)', 0),
+        ]
+        with self.settings(QUERY_REPEAT_LIMIT=3):
+            self.assertEqual(log.repeated(), {sql: 5})
+            self.assertEqual(len(log.problems(budget=6)), 2)
+        self.assertEqual(
+            query_shape('SELECT 1 WHERE id IN (%s, %s)'),
+            'SELECT 1 WHERE id IN (...)')
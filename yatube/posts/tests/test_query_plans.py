@@ -0,0 +1,85 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+# A table read without an index, or rows sorted after they are read.
+BAD_PLAN = re.compile(r'^SCAN \S+$|USE TEMP B-TREE')
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+        cls.post = post
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, url, pages=('', '?page=2')):
+        """Every SELECT behind ``url`` must be served by indexes."""
+        for query in (f'{url}{page}' for page in pages):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.get(query).status_code, 200)
+            selects = [
+                captured['sql'] for captured in context.captured_queries
+                if captured['sql'].startswith('SELECT')
+            ]
+            self.assertTrue(selects)
+            for sql in selects:
+                plan = self.explain(sql)
+                with self.subTest(url=query, sql=sql):
+                    self.assertFalse(
+                        [step for step in plan if BAD_PLAN.search(step)],
+                        plan)
+
+    def test_index(self):
+        """Главная читается по индексу без сортировки."""
+        self.assertIndexedPlans(reverse('posts:index'))
+
+    def test_group_posts(self):
+        """Лента группы читается по индексу без сортировки."""
+        self.assertIndexedPlans(
+            reverse('posts:group_list', args=[self.group.slug]))
+
+    def test_profile(self):
+        """Профиль читается по индексу без сортировки."""
+        self.assertIndexedPlans(reverse('posts:profile', args=[self.author]))
+
+    def test_post_detail(self):
+        """Пост и комментарии читаются по индексу без сортировки."""
+        self.assertIndexedPlans(
+            reverse('posts:post_detail', args=[self.post.pk]))
+
+    def test_follow_index(self):
+        """Лента подписок читается по индексу без сортировки."""
+        self.assertIndexedPlans(reverse('posts:follow_index'))
+
+    def test_cursor_pages(self):
+        """Переход по курсору тоже не сканирует таблицу."""
+        for url in (reverse('posts:index'), reverse('posts:follow_index')):
+            page = self.client.get(url).context['page_obj']
+            self.assertIndexedPlans(
+                url, pages=[f'?cursor={page.next_cursor}'])
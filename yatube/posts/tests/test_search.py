@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+from ..paginator import NEXT, encode_cursor
+from ..search import (build_match, rebuild_index, search_comments,
+                      search_posts)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test_slug',
+            description='test_description',
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Коты спят на тёплой батарее')
+        cls.dogs = Post.objects.create(
+            author=cls.other, text='Собака гуляет с котом <b>во дворе</b>')
+        cls.comment = Comment.objects.create(
+            post=cls.cats, author=cls.other, text='Ёжик тоже любит котов')
+
+    def test_russian_word_forms(self):
+        """Поиск находит другие формы слова и «е» вместо «ё»."""
+        posts, _ = search_posts('котами')
+        self.assertEqual(set(posts), {self.cats, self.dogs})
+        posts, _ = search_posts('теплая')
+        self.assertEqual(posts, [self.cats])
+        comments, _ = search_comments('ежики')
+        self.assertEqual(comments, [self.comment])
+
+    def test_filters_and_snippet(self):
+        """Фильтры по группе и автору, подсветка без чужой разметки."""
+        posts, _ = search_posts('кот', group=self.group.pk)
+        self.assertEqual(posts, [self.cats])
+        posts, _ = search_posts('кот', author=self.other.pk)
+        self.assertEqual(posts, [self.dogs])
+        self.assertIn('<mark>', posts[0].snippet)
+        self.assertNotIn('<b>', posts[0].snippet)
+
+    def test_cursor_pagination(self):
+        """Курсор ведёт на следующую страницу результатов."""
+        first, cursor = search_posts('кот', limit=1)
+        second, last_cursor = search_posts('кот', cursor=cursor, limit=1)
+        self.assertEqual(set(first + second), {self.cats, self.dogs})
+        self.assertIsNone(last_cursor)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        dogs = Post.objects.get(pk=self.dogs.pk)
+        dogs.text = 'Собака гуляет одна'
+        dogs.save()
+        self.assertEqual(search_posts('кот')[0], [self.cats])
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(search_posts('кот')[0], [])
+        rebuild_index()
+        self.assertEqual(search_posts('собака')[0], [self.dogs])
+
+    def test_query_is_escaped(self):
+        """Спецсимволы FTS5 из запроса не ломают поиск."""
+        self.assertEqual(build_match('" * ('), '')
+        self.assertEqual(build_match('OR'), '("or"*)')
+        response = Client().get(reverse('posts:search'), {'q': 'кот" NOT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_view_and_admin(self):
+        """Страница поиска и админка используют индекс."""
+        response = Client().get(reverse('posts:search'), {'q': 'батарея'})
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
+        admin = site._registry[Post]
+        request = RequestFactory().get('/')
+        queryset, _ = admin.get_search_results(
+            request, Post.objects.all(), 'батарея')
+        self.assertEqual(list(queryset), [self.cats])
+
+    def test_bad_cursor_ignored(self):
+        """Курсор с чужими значениями открывает первую страницу."""
+        for values in ([-1.0, 10 ** 20], ['кот', 1], [-1.0, 1.5]):
+            with self.subTest(values=values):
+                response = Client().get(reverse('posts:search'), {
+                    'q': 'кот', 'cursor': encode_cursor(values, NEXT)})
+                self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_unknown_author(self):
+        """Неизвестный автор — ошибка формы, а не поиск без фильтра."""
+        response = Client().get(
+            reverse('posts:search'), {'q': 'кот', 'author': 'nobody'})
+        self.assertEqual(list(response.context['page_obj']), [])
+        self.assertFormError(response, 'form', 'author', 'Такого автора нет.')
+
+    def test_admin_reports_limit(self):
+        """Админка предупреждает, что показаны не все совпадения."""
+        client = Client()
+        client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+        with mock.patch('posts.search.ADMIN_RESULTS_LIMIT', 1):
+            response = client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'кот'})
+        self.assertContains(response, 'Показаны 1 лучших совпадений')
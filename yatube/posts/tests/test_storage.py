@@ -0,0 +1,109 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from ..models import Blob, Post, User
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def upload(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(name, content, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='collector')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Thumbnail records live outside the test database.
+        cache.clear()
+        default.kvstore.clear()
+
+    def create(self, **kwargs):
+        kwargs.setdefault('image', upload())
+        return Post.objects.create(author=self.user, text='Пост', **kwargs)
+
+    def test_name_is_digest(self):
+        """Файл хранится под SHA-256 содержимого."""
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        post = self.create(image=upload('Котик.GIF'))
+        self.assertEqual(post.image.name, f'posts/{digest[:2]}/{digest}.gif')
+        with post.image.open('rb') as stored:
+            self.assertEqual(stored.read(), SMALL_GIF)
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки делят один файл и один Blob."""
+        first = self.create(image=upload('one.gif'))
+        second = self.create(image=upload('two.gif'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(Blob.objects.get(name=first.image.name).refcount, 2)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_last_reference_removes_file(self):
+        """Файл удаляется вместе с последним постом."""
+        first = self.create()
+        second = self.create()
+        path = first.image.path
+        Post.objects.get(pk=first.pk).delete()
+        self.assertTrue(os.path.exists(path))
+        Post.objects.get(pk=second.pk).delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.filter(name=first.image.name).exists())
+
+    def test_reupload_survives_pending_delete(self):
+        """Удаление файла, начатое до повторной загрузки, его не трогает."""
+        first = self.create()
+        with mock.patch('posts.blobs.run_async') as run_async:
+            Post.objects.get(pk=first.pk).delete()
+        function, name = run_async.call_args[0]
+        storage = Post._meta.get_field('image').storage
+        save = storage._save
+
+        def save_then_delete(*args):
+            # The delete runs between the upload and the post's insert.
+            saved = save(*args)
+            function(name)
+            return saved
+
+        with mock.patch.object(storage, '_save', save_then_delete):
+            second = self.create()
+        self.assertTrue(os.path.exists(second.image.path))
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+
+    def test_replaced_image_is_released(self):
+        """Замена картинки освобождает старый файл."""
+        post = Post.objects.get(pk=self.create().pk)
+        old_path = post.image.path
+        post.image = upload('new.gif', SMALL_GIF + b'\0')
+        post.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(Blob.objects.get(name=post.image.name).refcount, 1)
+
+    def test_shared_image_reuses_variants(self):
+        """Второй пост с той же картинкой не перерисовывает варианты."""
+        first = Post.objects.get(pk=self.create().pk)
+        with mock.patch('posts.thumbnails.build_variants') as build:
+            second = Post.objects.get(pk=self.create().pk)
+        build.assert_not_called()
+        self.assertTrue(second.image_ready)
+        self.assertEqual(second.image_variants, first.image_variants)
+        self.assertEqual(second.image_blurhash, first.image_blurhash)
@@ -0,0 +1,63 @@
+import io
+import shutil
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Blob, Comment, Follow, Group, Post, User
+from ..synthetic import Dataset
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SyntheticDatasetTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_records_depend_only_on_seed(self):
+        """Данные зависят от зерна, но не от числа процессов и чанков."""
+        options = {'users': 50, 'posts': 40, 'comments': 30,
+                   'images': ['posts/a.jpg']}
+        inline = list(Dataset(seed=7, **options).records(chunk_size=7))
+        pooled = list(Dataset(seed=7, **options).records(
+            workers=2, chunk_size=7))
+        self.assertEqual(inline, pooled)
+        self.assertNotEqual(
+            inline, list(Dataset(seed=8, **options).records(chunk_size=7)))
+
+    def test_follow_graph_is_skewed(self):
+        """Подписки сосредоточены на немногих популярных авторах."""
+        records = Dataset(users=500, groups=0, posts=0, comments=0,
+                          follows_per_user=10).records()
+        followers = Counter(record['author'] for record in records
+                            if record['type'] == 'follow')
+        counts = sorted(followers.values(), reverse=True)
+        self.assertGreater(counts[0], 10 * counts[len(counts) // 2])
+
+    def test_command_creates_dataset(self):
+        """Команда создаёт пользователей, посты, комментарии и подписки."""
+        call_command('generate_dataset', users=30, groups=3, posts=60,
+                     comments=40, image_ratio=0.5, workers=1,
+                     stdout=io.StringIO())
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        with_image = Post.objects.exclude(image='')
+        self.assertTrue(with_image.exists())
+        self.assertEqual(
+            sum(Blob.objects.values_list('refcount', flat=True)),
+            with_image.count())
+        post = Comment.objects.first().post
+        self.assertEqual(post.comments_count, post.comments.count())
@@ -0,0 +1,185 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from ..models import Post, User
+from .. import blurhash
+from ..templatetags.post_cards import post_cards
+from ..templatetags.post_images import post_picture
+from ..thumbnails import generate_thumbnails, image_formats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def upload(name='small.gif'):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+def upload_png(name='wide.png', size=(1000, 500)):
+    file_obj = BytesIO()
+    Image.new('RGB', size, (200, 10, 10)).save(file_obj, 'png')
+    return SimpleUploadedFile(name, file_obj.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Thumbnail records live outside the test database.
+        cache.clear()
+        default.kvstore.clear()
+
+    def test_upload_generates_thumbnails(self):
+        """После загрузки миниатюры готовы и попадают в карточку."""
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'С картинкой', 'image': upload()},
+        )
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(post.image_ready)
+        self.assertIn('<picture>', post_cards([post], 'index')[0])
+
+    def test_variants_follow_source_width(self):
+        """Ширины не больше исходной, пропорции как у карточки."""
+        post = Post.objects.create(
+            author=self.user, text='Широкая', image=upload_png())
+        variants = json.loads(Post.objects.get(pk=post.pk).image_variants)
+        self.assertEqual(set(variants), set(image_formats()))
+        self.assertEqual(
+            [(item['width'], item['height']) for item in variants['JPEG']],
+            [(320, 113), (640, 226), (960, 339)],
+        )
+
+    def test_metadata_stored(self):
+        """Размеры, вес, цвет и BlurHash сохраняются в посте."""
+        post = Post.objects.create(
+            author=self.user, text='Метаданные', image=upload_png())
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual((post.image_width, post.image_height), (1000, 500))
+        self.assertEqual(post.image_size, post.image.size)
+        self.assertEqual(post.image_color, '#c80a0a')
+        self.assertEqual(len(post.image_blurhash), 28)
+        self.assertIn('background-color: #c80a0a', post_picture(post))
+
+    def test_new_image_resets_variants(self):
+        """Новая картинка сбрасывает готовые варианты."""
+        post = Post.objects.create(
+            author=self.user, text='Замена', image=upload())
+        post = Post.objects.get(pk=post.pk)
+        with mock.patch('posts.signals.run_async'):
+            post.image = upload_png('other.png')
+            post.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertFalse(post.image_ready)
+        self.assertEqual(post.image_variants, '')
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_color, '')
+
+    def test_pending_post_shows_placeholder(self):
+        """Пока миниатюры не готовы, вместо картинки заглушка."""
+        with mock.patch('posts.signals.run_async') as run_async:
+            post = Post.objects.create(
+                author=self.user, text='Ждёт', image=upload())
+        run_async.assert_any_call(generate_thumbnails, post.pk)
+        self.assertFalse(post.image_ready)
+        card = post_cards([post], 'index')[0]
+        self.assertNotIn('<img', card)
+        self.assertIn('Картинка обрабатывается', card)
+
+    def test_text_edit_keeps_thumbnails(self):
+        """Правка текста не запускает генерацию заново."""
+        post = Post.objects.create(
+            author=self.user, text='Было', image=upload())
+        with mock.patch('posts.signals.run_async') as run_async:
+            post = Post.objects.get(pk=post.pk)
+            post.text = 'Стало'
+            post.save()
+        self.assertNotIn(
+            mock.call(generate_thumbnails, post.pk), run_async.mock_calls)
+        self.assertTrue(Post.objects.get(pk=post.pk).image_ready)
+
+    def test_broken_image_stays_pending(self):
+        """Повреждённый файл не помечается как готовый."""
+        post = Post.objects.create(
+            author=self.user, text='Битая',
+            image=SimpleUploadedFile('broken.gif', b'not an image'))
+        self.assertFalse(Post.objects.get(pk=post.pk).image_ready)
+
+
+class PostPictureTest(TestCase):
+    VARIANTS = {
+        'WEBP': [
+            {'name': 'cache/a.webp', 'width': 320, 'height': 113},
+            {'name': 'cache/b.webp', 'width': 960, 'height': 339},
+        ],
+        'JPEG': [
+            {'name': 'cache/a.jpg', 'width': 320, 'height': 113},
+            {'name': 'cache/b.jpg', 'width': 960, 'height': 339},
+        ],
+    }
+
+    def test_picture_markup(self):
+        """Разметка строится из сохранённых вариантов."""
+        post = Post(image='posts/x.png', image_variants=json.dumps(
+            self.VARIANTS))
+        html = post_picture(post)
+        self.assertIn(
+            '<source type="image/webp" srcset="/media/cache/a.webp 320w, '
+            '/media/cache/b.webp 960w"', html)
+        self.assertIn('src="/media/cache/b.jpg"', html)
+        self.assertIn(
+            'srcset="/media/cache/a.jpg 320w, /media/cache/b.jpg 960w"', html)
+        self.assertIn('width="960" height="339"', html)
+
+    def test_no_variants(self):
+        """Без вариантов тег ничего не выводит."""
+        self.assertEqual(post_picture(Post(image='posts/x.png')), '')
+
+    def test_webp_needs_pillow_support(self):
+        """WebP не выводится, если Pillow его не умеет."""
+        with mock.patch('posts.thumbnails.features.check', return_value=False):
+            self.assertEqual(image_formats(), ('JPEG',))
+
+
+class BlurHashTest(TestCase):
+    def test_solid_color(self):
+        """DC-компонента однотонной картинки равна её цвету."""
+        hash_ = blurhash.encode([(255, 0, 0)] * 16, 4, 4)
+        self.assertEqual(hash_[0], 'L')
+        self.assertEqual(hash_[2:6], blurhash.base83(0xFF0000, 4))
+        self.assertEqual(len(hash_), 28)
+
+    def test_components_in_size_flag(self):
+        """Первый символ кодирует число компонент."""
+        pixels = [(0, 0, 0), (255, 255, 255)] * 8
+        hash_ = blurhash.encode(pixels, 4, 4, x_components=5, y_components=4)
+        self.assertEqual(hash_[0], blurhash.BASE83[4 + 3 * 9])
+        self.assertEqual(len(hash_), 4 + 2 * 5 * 4)
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from ..models import Follow, Post, TimelineEntry, User
+from ..timeline import (backfill, fan_out_post, rebuild_timelines,
+                        timeline_posts)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.stranger = User.objects.create_user(username='stranger')
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленту каждого подписчика автора."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='fan-out')
+        self.assertIn(post, timeline_posts(self.follower))
+        self.assertNotIn(post, timeline_posts(self.stranger))
+
+    @override_settings(TIMELINE_FANOUT_BATCH_SIZE=1)
+    def test_fan_out_in_batches(self):
+        """Рассылка по подписчикам идёт пачками."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        post = Post.objects.create(author=self.author, text='batches')
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), 2)
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет старые посты, отписка их убирает."""
+        post = Post.objects.create(author=self.author, text='old post')
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        self.assertIn(post, timeline_posts(self.follower))
+        follow.delete()
+        self.assertFalse(self.follower.timeline.exists())
+
+    def test_late_tasks_skip_unfollowed_authors(self):
+        """Отложенные задачи не возвращают в ленту отписанного автора."""
+        Post.objects.create(author=self.author, text='old post')
+        with mock.patch('posts.signals.run_async'):
+            follow = Follow.objects.create(
+                user=self.follower, author=self.author)
+            post = Post.objects.create(author=self.author, text='new post')
+        follow.delete()
+        backfill(self.follower.pk, self.author.pk)
+        fan_out_post(post.pk)
+        self.assertFalse(self.follower.timeline.exists())
+
+    def test_deleted_post_leaves_timeline(self):
+        """Удалённый пост пропадает из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='to delete')
+        post.delete()
+        self.assertFalse(self.follower.timeline.exists())
+
+    def test_rebuild_timelines(self):
+        """Перестроение лент восстанавливает записи по подпискам."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'bulk {i}') for i in range(3))
+        rebuild_timelines()
+        self.assertEqual(self.follower.timeline.count(), 3)
+
+    def test_failed_rebuild_keeps_timelines(self):
+        """Прерванное перестроение не оставляет ленты пустыми."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(author=self.author, text='kept')
+        with mock.patch('posts.timeline._insert_entries',
+                        side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                rebuild_timelines()
+        self.assertEqual(self.follower.timeline.count(), 1)
@@ -0,0 +1,125 @@
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import uploads
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def png_header(width, height):
+    """A PNG header announcing ``width``×``height`` and no real pixels."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr)
+            + png_chunk(b'IDAT', zlib.compress(b'\0' * 64)))
+
+
+def jpeg(size=(200, 200)):
+    file_obj = BytesIO()
+    Image.new('RGB', size, (10, 120, 200)).save(file_obj, 'jpeg')
+    return file_obj.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        uploads.reset_pool()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post_image(self, content, name='picture.png'):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def assertRejected(self, response, message):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(message, str(response.context['form'].errors['image']))
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100 * 1024)
+    def test_too_many_bytes(self):
+        """Файл больше лимита отклоняется, не дочитываясь."""
+        response = self.post_image(jpeg() + b'\0' * 200 * 1024, 'big.jpg')
+        self.assertRejected(response, 'Файл слишком большой')
+
+    def test_too_many_pixels(self):
+        """Размер из заголовка больше лимита — отказ до декодирования."""
+        response = self.post_image(png_header(8000, 8000))
+        self.assertRejected(response, 'слишком большая')
+
+    def test_decompression_bomb(self):
+        """Заголовок за пределом самого Pillow тоже отклоняется."""
+        response = self.post_image(png_header(30000, 30000))
+        self.assertRejected(response, 'слишком большая')
+
+    def test_not_an_image(self):
+        """Не картинка отклоняется по заголовку."""
+        response = self.post_image(b'<?php echo 1; ?>', 'shell.png')
+        self.assertRejected(response, 'Загрузите картинку')
+
+    def test_valid_upload_saved(self):
+        """Нормальная картинка проходит проверку и сохраняется."""
+        response = self.post_image(jpeg(), 'photo.jpg')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Post.objects.get(author=self.user).image)
+
+
+class VerifyUploadTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        uploads.reset_pool()
+
+    def write(self, content):
+        fd, path = tempfile.mkstemp(suffix='.jpg')
+        with os.fdopen(fd, 'wb') as upload:
+            upload.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_decoded_in_pool(self):
+        """Целая картинка декодируется в отдельном процессе."""
+        self.assertEqual(
+            uploads.verify_upload(self.write(jpeg())), ('JPEG', (200, 200)))
+
+    def test_truncated_rejected(self):
+        """Обрезанный файл не проходит полное декодирование."""
+        content = jpeg((400, 400))
+        with self.assertRaises(ValidationError):
+            uploads.verify_upload(self.write(content[:len(content) // 2]))
+
+    @override_settings(IMAGE_VERIFY_TIMEOUT=0.000001)
+    def test_timeout_kills_pool(self):
+        """По таймауту пул перезапускается."""
+        with self.assertRaises(ValidationError):
+            uploads.verify_upload(self.write(jpeg()))
+        self.assertIsNone(uploads._pool)
@@ -6,9 +6,13 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.cache import get_stats
+
 from ..models import Follow, Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -100,16 +104,36 @@ class PostPagesTests(TestCase):
         self.check_form_context(response)
 
     def test_cache_index(self):
+        """Главная страница кешируется до первой записи."""
         get_post = self.authorized_client.get(
             reverse('posts:index')).content
+        get_post_1 = self.authorized_client.get(
+            reverse('posts:index')).content
+        self.assertEqual(get_post, get_post_1)
+        self.assertEqual(
+            get_stats('index_page'), {'hits': 1, 'misses': 1, 'stale': 0})
         Post.objects.create(
             author=self.user,
             text='Cache_post',
             image=self.uploaded
         )
-        get_post_1 = self.authorized_client.get(
+        get_post_2 = self.authorized_client.get(
             reverse('posts:index')).content
-        self.assertEqual(get_post, get_post_1, 'Появился новый пост!')
+        self.assertNotEqual(get_post, get_post_2, 'Новый пост не появился!')
+
+    def test_group_first_page_is_built_once(self):
+        """Первая страница группы читается из базы один раз до записи."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(url)
+        self.assertLess(len(second), len(first))
+        Post.objects.create(
+            author=self.user, text='Новый пост группы', group=self.group)
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context['page_obj'][0].text, 'Новый пост группы')
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -0,0 +1,144 @@
+"""Thumbnail generation kept off the request path.
+
+A worker reads the image metadata, then renders every width in
+``POST_IMAGE_WIDTHS`` in each supported format and stores their names
+and sizes on the post, so templates build ``srcset`` markup and
+placeholders from the row alone and never touch the file system.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils import timezone
+from PIL import Image, features
+from sorl.thumbnail import default, get_thumbnail
+
+from core.cache import bump_version
+
+from . import blurhash
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+# Fields copied between posts sharing one stored file.
+SHARED_FIELDS = (
+    'image_variants', 'image_width', 'image_height', 'image_size',
+    'image_color', 'image_blurhash',
+)
+SAMPLE_SIZE = (32, 32)
+PALETTE_SIZE = 5
+
+
+def image_formats():
+    """Output formats, best first; WebP only if Pillow can encode it."""
+    if features.check('webp'):
+        return ('WEBP', 'JPEG')
+    return ('JPEG',)
+
+
+def variant_widths(source_width):
+    """Configured widths not wider than the upload, at least the smallest."""
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    return [width for width in widths if width <= source_width] or widths[:1]
+
+
+def build_variants(image, source_width):
+    """Render all variants of ``image``; ``None`` if any of them failed."""
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    variants = {}
+    for image_format in image_formats():
+        rendered = []
+        for width in variant_widths(source_width):
+            height = round(width * aspect_height / aspect_width)
+            thumbnail = get_thumbnail(
+                image, f'{width}x{height}',
+                crop='center', upscale=True, format=image_format)
+            if not thumbnail.exists():
+                logger.warning(
+                    'Could not render %s %dx%d', image_format, width, height)
+                return None
+            rendered.append({
+                'name': thumbnail.name,
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+            })
+        variants[image_format] = rendered
+    return variants
+
+
+def dominant_color(image):
+    """Most frequent colour of a small palette of the image, as ``#rrggbb``."""
+    palette_image = image.quantize(colors=PALETTE_SIZE)
+    _, index = max(palette_image.getcolors())
+    red, green, blue = palette_image.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def read_metadata(image):
+    """Dimensions, byte size, dominant colour and BlurHash of an image.
+
+    The file is decoded once, into a 32x32 sample.
+    """
+    with image.open('rb'), Image.open(image) as source:
+        width, height = source.size
+        source.draft('RGB', SAMPLE_SIZE)
+        sample = source.convert('RGB').resize(SAMPLE_SIZE)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': image.size,
+        'image_color': dominant_color(sample),
+        'image_blurhash': blurhash.encode(
+            list(sample.getdata()), *SAMPLE_SIZE),
+    }
+
+
+def update_post(post, **fields):
+    """Store ``fields`` unless the post image was replaced meanwhile."""
+    updated = Post.objects.filter(
+        pk=post.pk, image=post.image.name
+    ).update(updated=timezone.now(), **fields)
+    if updated:
+        bump_version('index_page')
+    return bool(updated)
+
+
+def generate_thumbnails(post_id):
+    """Read the metadata and render the responsive variants of an image.
+
+    The metadata is saved first, so placeholders get their colours while
+    the variants are rendered. Posts sharing a stored file copy all of it
+    from the first one. The post is marked ready only if all variants
+    exist.
+    """
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return False
+    shared = Post.objects.filter(
+        image=post.image.name, image_ready=True, image_width__isnull=False
+    ).exclude(pk=post_id).exclude(
+        image_variants='').values(*SHARED_FIELDS).first()
+    if shared:
+        return update_post(post, image_ready=True, **shared)
+    try:
+        metadata = read_metadata(post.image)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Post %s has an unreadable image', post_id)
+        return False
+    if not update_post(post, **metadata):
+        return False
+    variants = build_variants(post.image, metadata['image_width'])
+    if variants is None:
+        return False
+    return update_post(
+        post, image_ready=True, image_variants=json.dumps(variants))
+
+
+def prefetch_thumbnails(posts):
+    """Load sorl records for posts still rendered by ``{% thumbnail %}``."""
+    default.kvstore.prefetch([
+        post.image for post in posts
+        if post.image_ready and not post.image_variants
+    ])
@@ -0,0 +1,152 @@
+"""Bounded handling of image uploads.
+
+``ImageUploadHandler`` streams every upload to a temporary file and
+rejects it as soon as the byte limit is crossed or the header announces
+too many pixels, before anything is decoded. ``verify_upload`` then
+decodes the accepted file in a separate process with a timeout, so a
+hostile image can neither stall a web worker nor inflate its memory.
+"""
+import atexit
+import multiprocessing
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import (StopUpload,
+                                             TemporaryFileUploadHandler)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+_pool = None
+
+
+def read_header(data):
+    """Size of the image whose first bytes are ``data``, or ``None``.
+
+    ``Image.open`` only parses the header; nothing is decoded. Headers
+    far beyond Pillow's own pixel limit raise ``DecompressionBombError``.
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return image.size
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploads to disk and rejects oversized images early.
+
+    Errors are collected in ``request.upload_errors`` by field name, and
+    rejected files are left out of ``request.FILES``.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.checked = False
+        self.error = None
+
+    def reject(self, message):
+        self.error = message
+        self.request.upload_errors[self.field_name] = message
+
+    def check_header(self, final=False):
+        try:
+            size = read_header(self.header)
+        except Image.DecompressionBombError:
+            size = (settings.POST_IMAGE_MAX_PIXELS + 1, 1)
+        if size is None:
+            if final or len(self.header) >= settings.IMAGE_HEADER_MAX_BYTES:
+                self.reject('Загрузите картинку в формате JPEG, PNG или GIF.')
+            return
+        self.checked = True
+        width, height = size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject(
+                f'Картинка {width}×{height} слишком большая: не больше '
+                f'{settings.POST_IMAGE_MAX_PIXELS // 10 ** 6} мегапикселей.')
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.reject(
+                'Файл слишком большой: не больше '
+                f'{settings.POST_IMAGE_MAX_BYTES // 2 ** 20} МБ.')
+            raise StopUpload(connection_reset=True)
+        if self.error is not None:
+            return None
+        if not self.checked:
+            self.header += raw_data
+            self.check_header()
+            if self.error is not None:
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.error is None and not self.checked:
+            self.check_header(final=True)
+        if self.error is not None:
+            self.file.close()
+            return None
+        return super().file_complete(file_size)
+
+
+def image_upload(view_func):
+    """Use ``ImageUploadHandler`` for the view's uploads.
+
+    Upload handlers must be set before anything reads ``request.POST``,
+    which the CSRF middleware does, so the check is moved inside.
+    """
+    protected = csrf_protect(view_func)
+
+    @csrf_exempt
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        request.upload_errors = {}
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapped_view
+
+
+def decode_image(path, max_pixels):
+    """Fully decode the image; runs in the verification pool."""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(path) as image:
+        image.load()
+        return image.format, image.size
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = multiprocessing.get_context('spawn').Pool(
+            processes=settings.IMAGE_VERIFY_WORKERS,
+            maxtasksperchild=settings.IMAGE_VERIFY_MAX_TASKS,
+        )
+        # Stop the workers before module globals are torn down at exit.
+        atexit.register(reset_pool)
+    return _pool
+
+
+def reset_pool():
+    """Kill the pool, including a worker stuck on a hostile file."""
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+
+
+def verify_upload(path):
+    """Decode the file at ``path`` in the pool or raise ``ValidationError``."""
+    result = get_pool().apply_async(
+        decode_image, (path, settings.POST_IMAGE_MAX_PIXELS))
+    try:
+        return result.get(timeout=settings.IMAGE_VERIFY_TIMEOUT)
+    except multiprocessing.TimeoutError:
+        reset_pool()
+        raise ValidationError(
+            'Картинку не удалось проверить, попробуйте другую.')
+    except Exception:
+        raise ValidationError('Файл повреждён или не является картинкой.')
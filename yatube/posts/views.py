@@ -1,30 +1,91 @@
 """Posts's view function."""
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
-from .forms import CommentForm, PostForm
+from core.cache import (cache_page_versioned, get_version, make_etag,
+                        single_flight)
+from core.queries import query_budget
+from core.replicas import read_your_writes
+
+from .counters import get_counters
+from .exporter import FORMATS, export_stream
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Comment, Follow, Group, Post, User
+from .paginator import CursorPaginator, cursor_page
+from .search import is_available, search_comments, search_posts
+from .timeline import TIMELINE_ORDERING, timeline_posts
+from .uploads import image_upload
+
+
+def versions_etag(*namespaces):
+    """ETag function for ``condition`` built from cache namespace versions.
+
+    ``index_page`` is bumped by every post, group or user change,
+    ``follows`` by follows and ``timelines`` once the fan-out is written.
+    """
+    def etag_func(request, **kwargs):
+        return make_etag(request, [
+            namespace.format(**kwargs) for namespace in namespaces])
+    return etag_func
 
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, 10)
+def get_page_context(queryset, request, cache_key=None, **kwargs):
+    """Page of ``queryset`` for the request's cursor or page number.
+
+    With ``cache_key`` the first page, the one most visitors load, is
+    cached under the ``index_page`` version and rebuilt by one request
+    at a time.
+    """
+    paginator = CursorPaginator(queryset, 10, **kwargs)
+    cursor = request.GET.get('cursor')
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if cache_key is not None and not cursor and page_number in (None, '1'):
+        rows = single_flight(
+            f'{cache_key}:v{get_version("index_page")}',
+            paginator.first_rows,
+            settings.INDEX_PAGE_CACHE_TIMEOUT)
+        return paginator.page_from_rows(rows)
+    return paginator.get_cursor_page(cursor=cursor, page_number=page_number)
+
+
+def export_response(request, name, **filters):
+    """Streamed download of posts and comments, ``?format=csv&gzip=1``."""
+    file_format = request.GET.get('format')
+    if file_format not in FORMATS:
+        file_format = 'ndjson'
+    compress = request.GET.get('gzip') == '1'
+    content_type, extension = FORMATS[file_format]
+    if compress:
+        content_type, extension = 'application/gzip', f'{extension}.gz'
+    response = StreamingHttpResponse(
+        export_stream(file_format, compress, **filters),
+        content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{extension}"')
+    return response
 
 
-@cache_page(20, key_prefix='index_page')
+@query_budget(4)
+@condition(etag_func=versions_etag('index_page'))
+@cache_page_versioned(settings.INDEX_PAGE_CACHE_TIMEOUT, 'index_page')
 def index(request):
     context = {'page_obj': get_page_context(
-        Post.objects.select_related('author'),
+        Post.objects.select_related('author', 'group'),
         request)}
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(6)
+@condition(etag_func=versions_etag('index_page'))
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    page_obj = get_page_context(group.posts.select_related('group'), request)
+    page_obj = get_page_context(
+        group.posts.select_related('author', 'group'), request,
+        cache_key=f'group_page:{group.pk}')
     context = {
         'group': group,
         'page_obj': page_obj
@@ -32,9 +93,12 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(7)
+@condition(etag_func=versions_etag('index_page', 'follows'))
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author')
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    posts = author.posts.select_related('author', 'group')
     following = (request.user.is_authenticated
                  and Follow.objects.filter(
                      user=request.user,
@@ -42,16 +106,23 @@ def profile(request, username):
     context = {
         'following': following,
         'author': author,
-        'page_obj': get_page_context(posts, request),
+        'counters': get_counters(author),
+        'page_obj': get_page_context(
+            posts, request, cache_key=f'profile_page:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
+@condition(etag_func=versions_etag('index_page', 'comments:{post_id}'))
 def post_detail(request, post_id):
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post.objects.select_related('author'), pk=post_id)
-    n_posts = post.author.posts.count()
-    comments = Comment.objects.filter(post_id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'author__counters', 'group'),
+        pk=post_id)
+    n_posts = get_counters(post.author).posts_count
+    comments = Comment.objects.filter(
+        post_id=post_id).select_related('author')
     context = {
         'post': post,
         'n_posts': n_posts,
@@ -61,11 +132,14 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(20)
 @login_required
+@image_upload
 def post_create(request):
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None)
+        files=request.FILES or None,
+        upload_errors=request.upload_errors)
     if form.is_valid():
         form = form.save(commit=False)
         form.author = request.user
@@ -75,7 +149,9 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(20)
 @login_required
+@image_upload
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -83,8 +159,9 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post)
-    if request.method == "POST" and form.is_valid:
+        instance=post,
+        upload_errors=request.upload_errors)
+    if request.method == "POST" and form.is_valid():
         form.save()
         return redirect('posts:post_detail', post_id=post_id)
     return render(
@@ -94,6 +171,7 @@ def post_edit(request, post_id):
     )
 
 
+@query_budget(8)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(
@@ -108,17 +186,22 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(4)
 @login_required
+@condition(etag_func=versions_etag('index_page', 'follows', 'timelines'))
 def follow_index(request):
     context = {
         'page_obj': get_page_context(
-            Post.objects.filter(author__following__user=request.user),
-            request)
+            timeline_posts(request.user).select_related('author', 'group'),
+            request,
+            ordering=TIMELINE_ORDERING)
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(12)
 @login_required
+@read_your_writes
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -126,10 +209,55 @@ def profile_follow(request, username):
     return redirect('posts:profile', username=author)
 
 
+@query_budget(12)
 @login_required
+@read_your_writes
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(
         user=request.user, author=author
     ).delete()
     return redirect("posts:profile", username=author)
+
+
+@query_budget(6)
+def search(request):
+    form = SearchForm(request.GET or None)
+    results, next_cursor = [], None
+    if form.is_valid() and is_available():
+        data = form.cleaned_data
+        author = data['author']
+        cursor = request.GET.get('cursor')
+        if data['scope'] == 'comments':
+            results, next_cursor = search_comments(
+                data['q'], author=author, cursor=cursor)
+        else:
+            results, next_cursor = search_posts(
+                data['q'],
+                group=data['group'].pk if data['group'] else None,
+                author=author,
+                cursor=cursor)
+    context = {
+        'form': form,
+        'page_obj': cursor_page(
+            results,
+            next_cursor=next_cursor,
+            has_previous=bool(request.GET.get('cursor'))),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(4)
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(request, author.username, author=author)
+
+
+@query_budget(4)
+@login_required
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(request, group.slug, group=group)
@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +29,8 @@ SECRET_KEY = '5(2kd4%(+vg=!o(9x82r1tkn-_5=u(^p0-%g5cw+*k8w_kz17i'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -50,8 +56,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.queries.QueryInspectorMiddleware',
     'django.middleware.cache.UpdateCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,9 +98,41 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Workers keep their connection instead of reopening it per request.
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Applied to every new SQLite connection by core.db.configure_sqlite.
+# In WAL mode NORMAL sync is still safe against corruption; cache_size is
+# in KiB when negative, mmap_size in bytes, busy_timeout in milliseconds.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# YATUBE_SQLITE_REPLICAS=N adds N read replicas: SQLite copies of the
+# database refreshed by the replicate_sqlite command. Reads use a replica
+# synced at most REPLICA_MAX_LAG seconds ago; users who write stay on the
+# primary for REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = tuple(
+    f'replica{number}' for number in
+    range(1, int(os.environ.get('YATUBE_SQLITE_REPLICAS', 0)) + 1))
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_MAX_LAG = 5
+REPLICA_PIN_SECONDS = 10
+REPLICA_HEALTH_CHECK_INTERVAL = 1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,10 +185,79 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+if TESTING:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors=True)
+else:
+    CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+# Per-process LRU in front of an SQLite store shared by all workers.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.TieredCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
+# Thumbnail records live in a local SQLite file next to the cache,
+# fronted by a per-process LRU of this many records.
+THUMBNAIL_KVSTORE = 'core.thumbnail_kvstore.KVStore'
+THUMBNAIL_KVSTORE_PATH = os.path.join(
+    CACHES['default']['LOCATION'], 'thumbnails.sqlite3')
+THUMBNAIL_KVSTORE_LRU_SIZE = 10000
+
+# Index pages stay cached until a post, group or user changes.
+INDEX_PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Expired entries are kept this long to be served while one worker
+# rebuilds them; other workers wait at most CACHE_LOCK_TIMEOUT seconds.
+CACHE_STALE_TIMEOUT = 60 * 60 * 24
+CACHE_LOCK_TIMEOUT = 10
+CACHE_LOCK_POLL_INTERVAL = 0.05
+# Hit and miss counters are summed per process and written to the shared
+# cache at most this often, in seconds.
+CACHE_STATS_FLUSH_INTERVAL = 0 if TESTING else 10
+# Rendered feed cards are keyed by post version and live for a day.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Background tasks run inline under tests and in a thread pool otherwise.
+TASKS_ALWAYS_EAGER = TESTING
+TASKS_MAX_WORKERS = 4
+
+# Followers are written to the materialized timeline in batches of this size.
+TIMELINE_FANOUT_BATCH_SIZE = 500
+
+# Widths rendered in the background after an upload, cropped to the
+# aspect ratio of feed cards. WebP copies are added when Pillow supports it.
+POST_IMAGE_WIDTHS = (320, 640, 960, 1920)
+POST_IMAGE_ASPECT = (960, 339)
+
+# Progress of the resumable collect_media_garbage command.
+MEDIA_GC_STATE_PATH = os.path.join(
+    CACHES['default']['LOCATION'], 'media_gc.json')
+
+# Uploads are streamed to disk and rejected by size or by the pixel count
+# in their header; accepted ones are decoded in a separate process pool.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_HEADER_MAX_BYTES = 256 * 1024
+IMAGE_VERIFY_WORKERS = 2
+IMAGE_VERIFY_MAX_TASKS = 100
+IMAGE_VERIFY_TIMEOUT = 10
+
+# Query budgets and N+1 detection: 'raise' fails the request, 'log' only
+# warns and 'off' removes the middleware. A SELECT repeated more than
+# QUERY_REPEAT_LIMIT times in one request counts as N+1.
+QUERY_INSPECTOR_MODE = os.environ.get(
+    'YATUBE_QUERY_INSPECTOR',
+    'raise' if TESTING else 'log' if DEBUG else 'off')
+QUERY_REPEAT_LIMIT = 3
+
+# Exports read this many rows per keyset query; keep it under SQLite's
+# 999 query parameters, a group's post ids are passed in one IN list.
+EXPORT_BATCH_SIZE = 500